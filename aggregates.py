@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+Running Q1–Q7 aggregates.
+
+Keeping count, sum and sum of squares per question is enough for the means
+the results pages show, plus variance and standard error, without going back
+to the individual responses.
+
+DailyStats keeps those aggregates per calendar day, with prefix sums over the
+sorted days, so a date range is answered with two binary searches, and a
+month-by-month or week-by-week trend with one subtraction per period.
+
+Means hide a congregation split between very high and very low scores, so
+ScoreHistogram also counts how often each score 1–10 was given per question:
+70 counts from which medians, quartiles and shares below a threshold are
+exact.
+"""
+
+from datetime import date, datetime
+
+import numpy as np
+
+QUESTIONS = [f"Q{i}" for i in range(1, 8)]
+SCALE = np.arange(1, 11)  # the survey sliders' range
+
+
+class ScoreStats:
+    """Count, sum and sum of squares for each of Q1–Q7."""
+
+    def __init__(self):
+        self.n = 0  # responses (rows), whether or not every score is usable
+        self.count = np.zeros(len(QUESTIONS))
+        self.total = np.zeros(len(QUESTIONS))
+        self.total_sq = np.zeros(len(QUESTIONS))
+
+    def add(self, scores):
+        """Add one response's scores."""
+        values = np.array([_number(s) for s in scores], dtype=float)
+        valid = ~np.isnan(values)
+        values[~valid] = 0.0
+        self.n += 1
+        self.count += valid
+        self.total += values
+        self.total_sq += values * values
+
+    def add_values(self, values):
+        """Add a block of responses: a rows x 7 float array, NaN where unusable."""
+        valid = ~np.isnan(values)
+        values = np.where(valid, values, 0.0)
+        self.n += len(values)
+        self.count += valid.sum(axis=0)
+        self.total += values.sum(axis=0)
+        self.total_sq += (values * values).sum(axis=0)
+
+    def add_record(self, record):
+        self.add([record.get(q, "") for q in QUESTIONS])
+
+    def merge(self, other):
+        self.n += other.n
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        return self
+
+    def copy(self):
+        return ScoreStats().merge(self)
+
+    def means(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.total / self.count
+
+    def variance(self):
+        """Sample variance per question (NaN with fewer than two scores)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (self.total_sq - self.total * self.total / self.count) / (self.count - 1)
+        return np.where(self.count > 1, np.maximum(var, 0.0), np.nan)
+
+    def stderr(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(self.variance() / self.count)
+
+
+class ScoreHistogram:
+    """How many responses gave each score 1–10, for each of Q1–Q7.
+
+    Scores off that scale (blank, text, 7.5) are not counted.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros((len(QUESTIONS), len(SCALE)), dtype=np.int64)
+
+    def add(self, scores):
+        """Add one response's scores."""
+        for q, value in enumerate(_number(s) for s in scores):
+            if 1 <= value <= 10 and value == int(value):
+                self.counts[q, int(value) - 1] += 1
+
+    def add_values(self, values):
+        """Add a block of responses: a rows x 7 float array, NaN where unusable."""
+        rows, questions = np.nonzero(np.isin(values, SCALE))
+        np.add.at(self.counts, (questions, values[rows, questions].astype(np.int64) - 1), 1)
+
+    def add_record(self, record):
+        self.add([record.get(q, "") for q in QUESTIONS])
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def copy(self):
+        return ScoreHistogram().merge(self)
+
+    def quantile(self, q):
+        """The q-quantile (0–1) of each question's scores, as np.quantile gives it; NaN if none."""
+        n = self.counts.sum(axis=1)
+        cumulative = self.counts.cumsum(axis=1)
+        position = q * (n - 1)
+        lo, hi = np.floor(position), np.ceil(position)
+
+        def score_at(rank):  # rank-th smallest score, counting from 0
+            return SCALE[np.minimum((cumulative <= rank[:, None]).sum(axis=1), len(SCALE) - 1)]
+
+        value = score_at(lo) + (position - lo) * (score_at(hi) - score_at(lo))
+        return np.where(n > 0, value, np.nan)
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def share_below(self, threshold):
+        """Share of each question's scores below threshold (NaN if none)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.counts[:, SCALE < threshold].sum(axis=1) / self.counts.sum(axis=1)
+
+
+class DailyStats:
+    """Q1–Q7 aggregates per day for one church code, queryable by date range."""
+
+    def __init__(self):
+        self._days = {}  # date ordinal -> ScoreStats
+        self._prefix = None  # sorted ordinals + cumulative sums, rebuilt after changes
+
+    def add(self, day, scores):
+        self._days.setdefault(day, ScoreStats()).add(scores)
+        self._prefix = None
+
+    def add_record(self, day, record):
+        self.add(day, [record.get(q, "") for q in QUESTIONS])
+
+    def add_values(self, days, values):
+        """Add a block of responses: their date ordinals and a rows x 7 float array."""
+        days, inverse = np.unique(days, return_inverse=True)
+        valid = ~np.isnan(values)
+        values = np.where(valid, values, 0.0)
+        n = np.bincount(inverse, minlength=len(days))
+        count, total, total_sq = (np.zeros((len(days), len(QUESTIONS))) for _ in range(3))
+        np.add.at(count, inverse, valid)
+        np.add.at(total, inverse, values)
+        np.add.at(total_sq, inverse, values * values)
+        for i, day in enumerate(days.tolist()):
+            stats = self._days.get(day)
+            if stats is None:
+                stats = self._days[day] = ScoreStats()
+            stats.n += int(n[i])
+            stats.count += count[i]
+            stats.total += total[i]
+            stats.total_sq += total_sq[i]
+        self._prefix = None
+
+    def between(self, start, end):
+        """ScoreStats for responses dated start..end (dates, both inclusive)."""
+        days, n, count, total, total_sq = self._build()
+        lo = np.searchsorted(days, start.toordinal(), side="left")
+        hi = np.searchsorted(days, end.toordinal(), side="right")
+        stats = ScoreStats()
+        stats.n = int(n[hi] - n[lo])
+        stats.count = count[hi] - count[lo]
+        stats.total = total[hi] - total[lo]
+        stats.total_sq = total_sq[hi] - total_sq[lo]
+        return stats
+
+    def periods(self, unit="month"):
+        """[(first day, ScoreStats)] per calendar month, or week from Monday, with responses."""
+        days, n, count, total, total_sq = self._build()
+        if unit == "week":
+            starts = days - (days - 1) % 7  # ordinal 1 was a Monday
+        else:
+            as_dates = np.datetime64("0001-01-01") + (days - 1).astype("timedelta64[D]")
+            starts = (as_dates.astype("datetime64[M]").astype("datetime64[D]") - np.datetime64("0001-01-01")).astype(np.int64) + 1
+        firsts, lo = np.unique(starts, return_index=True)
+        hi = np.append(lo[1:], len(days))
+        result = []
+        for first, a, b in zip(firsts.tolist(), lo.tolist(), hi.tolist()):
+            stats = ScoreStats()
+            stats.n = int(n[b] - n[a])
+            stats.count = count[b] - count[a]
+            stats.total = total[b] - total[a]
+            stats.total_sq = total_sq[b] - total_sq[a]
+            result.append((date.fromordinal(first), stats))
+        return result
+
+    def _build(self):
+        if self._prefix is None:
+            days = np.array(sorted(self._days), dtype=np.int64)
+            rows = [self._days[d] for d in days]
+            zeros = np.zeros((1, len(QUESTIONS)))
+
+            def cumulative(field):
+                return np.vstack([zeros] + [getattr(s, field) for s in rows]).cumsum(axis=0)
+
+            n = np.concatenate([[0], np.cumsum([s.n for s in rows])]).astype(np.int64)
+            self._prefix = (days, n, cumulative("count"), cumulative("total"), cumulative("total_sq"))
+        return self._prefix
+
+
+def parse_timestamp(timestamp):
+    """Naive (wall-clock) datetime of a sheet timestamp, or None if it can't be parsed."""
+    text = str(timestamp).strip()
+    try:
+        return datetime.fromisoformat(text).replace(tzinfo=None)
+    except ValueError:
+        pass
+    import pandas as pd  # only for the rare timestamp fromisoformat() can't read
+    parsed = pd.to_datetime(text, errors="coerce")  # same leniency as the old filter
+    return None if pd.isna(parsed) else parsed.to_pydatetime().replace(tzinfo=None)
+
+
+def parse_day(timestamp):
+    """Date ordinal of a sheet timestamp, or None if it can't be parsed."""
+    parsed = parse_timestamp(timestamp)
+    return None if parsed is None else parsed.toordinal()
+
+
+def _number(value):
+    # sheet cells are already numericised; anything else (blank, text) is skipped
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return np.nan
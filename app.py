@@ -15,159 +15,191 @@ Created on Wed Jul 30 16:56:21 2025
 
 import streamlit as st
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.colors import LinearSegmentedColormap
-import re
-import pandas as pd
 import base64
+import hashlib
+import hmac
 import time
-import gspread
-#from google.oauth2.service_account import Credentials
 from datetime import datetime
 from zoneinfo import ZoneInfo
 #import qrcode
-from PIL import Image
-#from io import BytesIO
+from io import BytesIO
 
-from google.oauth2.service_account import Credentials
+# Sheets, storage and PIL are imported where first used, so a fresh process
+# paints the survey page without loading gspread, pandas or PIL.
+from checklist import classify, main_virtues, questions
+from comparison import MIN_COHORT, Comparison
+from metrics import metrics
+from radar_svg import render_radar_svg
+from uploads import UploadError, control_id_pairs, survey_stats
 
-def clean_label(label: str) -> str:
-    # 1. Remove HTML tags like <b>...</b>, <i>...</i>
-    text = re.sub(r"<.*?>", "", label)
-    # 2. Remove Markdown bold/italic markers ** and _
-    text = text.replace("**", "").replace("*", "").replace("_", "")
-    return text.strip()
-    
 def append_response(row_data):
-    retries = 3
-    for attempt in range(retries):
-        try:
-            sheet = get_sheet()  # get fresh sheet each time
-            sheet.append_row(row_data)
-            st.cache_data.clear()  # clear cached data so load_data() sees updates
-            return True
-        except Exception as e:
-            if attempt < retries - 1:
-                time.sleep(2)
-            else:
-                st.error("Submission failed. Please try again.")
-                print("Google Sheets write error:", e)
-                return False
+    try:
+        get_store().append(row_data)
+        return True
+    except Exception as e:
+        st.error("Submission failed. Please try again.")
+        print("Response store write error:", e)
+        return False
                 
 # =========================
-# GOOGLE SHEETS SETUP
+# METRICS
 # =========================
-def get_sheet():
-    creds = Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"],
-        scopes=[
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive"
-        ]
+# [app] metrics = false turns instrumentation off; metrics_sample_rate = 0.1
+# times one stage run in ten; metrics_log = true prints a JSON line for every
+# timing; metrics_port = 9100 serves Prometheus text at :9100/metrics;
+# admin_key unlocks the diagnostics panel at the bottom of ?admin=<admin_key>.
+@st.cache_resource  # once per process
+def setup_metrics():
+    config = st.secrets["app"]
+    metrics.configure(config.get("metrics", True), config.get("metrics_sample_rate", 1.0), config.get("metrics_log", False))
+    port = config.get("metrics_port")
+    return metrics.serve(int(port)) if port else None
+
+# =========================
+# STORAGE SETUP
+# =========================
+# [app] store = "sheets" (default) or "sqlite"; with sqlite, mirror_to_sheets = true
+# also copies every response to the Google Sheet in the background.
+# sheets_requests_per_minute caps our Sheets API calls (match the project quota).
+@st.cache_resource  # one authorized client per process, shared by all sessions
+def get_sheet_pool():
+    from sheets import SheetPool
+    config = st.secrets["app"]
+    return SheetPool(
+        st.secrets["gcp_service_account"], config["sheet_url"],
+        requests_per_minute=config.get("sheets_requests_per_minute", 60)
     )
-    client = gspread.authorize(creds)
-    return client.open_by_url(st.secrets["app"]["sheet_url"]).sheet1
 
-@st.cache_data(ttl=15)  # caches the actual rows for 15 seconds
-def load_data():
-    sheet = get_sheet()  # fresh credentials every call
-    return sheet.get_all_records()
+@st.cache_resource  # one store (and in-memory table) per process
+def get_store():
+    from storage import SheetsStore, SQLiteStore
+    config = st.secrets["app"]
+    spool_path = config.get("spool_path", "submissions.db")
+    snapshot_path = config.get("snapshot_path", "responses_snapshot.npz") or None  # "" turns snapshots off
+    share = get_share()
+    if config.get("store", "sheets") == "sqlite":
+        mirror = SheetsStore(get_sheet_pool(), spool_path) if config.get("mirror_to_sheets", False) else None
+        store = SQLiteStore(config.get("sqlite_path", "responses.db"), mirror, snapshot_path, share)
+    else:
+        store = SheetsStore(get_sheet_pool(), spool_path, snapshot_path, share)
+    spool = store.spool if isinstance(store, SheetsStore) else getattr(store.mirror, "spool", None)
+    metrics.collect("store", lambda: {
+        "table_rows": len(store.table),
+        "table_memory_bytes": store.table.memory_usage()["total"],
+        "table_version": store.table.version,
+        "spool_pending_rows": spool.pending() if spool else 0,
+    })
+    return store
+
+def get_share():
+    # optional: lets replicas behind a load balancer share one synced table
+    config = st.secrets["app"]
+    kind = config.get("shared_cache", "")
+    if kind == "file":
+        from shared import FileShare
+        return FileShare(config.get("shared_cache_path", "responses_shared.npz"))
+    if kind == "redis":
+        from shared import RedisShare
+        return RedisShare.from_url(config["redis_url"])
+    return None
+
+def load_table():
+    return get_store().refresh()  # only new rows are read
+
+# =========================
+# UPLOADS
+# =========================
+# Every rerun sees the attached files again, so parsing and joining are cached
+# by file content (and, for the join, the data version of the churches in it).
+def file_digest(uploaded):
+    return hashlib.sha256(uploaded.getvalue()).hexdigest()
+
+# cache_requests / cache_misses are counted per cache: a miss is a run of the body
+@st.cache_resource(max_entries=16)
+def parse_survey_upload(name, digest, _uploaded):
+    metrics.count("cache_misses", cache="survey_upload")
+    with metrics.timer("upload.survey"):
+        return survey_stats(_uploaded)
+
+@st.cache_resource(max_entries=16)
+def parse_control_id_upload(name, digest, _uploaded):
+    metrics.count("cache_misses", cache="control_id_upload")
+    with metrics.timer("upload.control_ids"):
+        pairs = control_id_pairs(_uploaded)
+    return pairs, tuple(sorted({code for code, _ in pairs}))
+
+@st.cache_resource(max_entries=16)
+def match_control_ids(digest, versions, _pairs):
+    metrics.count("cache_misses", cache="control_id_match")
+    with metrics.timer("control_id_match"):
+        return load_table().match_control_ids(_pairs)
+
+# =========================
+# COMPARISON
+# =========================
+# [app] comparison_min_respondents (default 5): churches with fewer responses
+# are left out of comparisons. Built once per data version and shared by all
+# sessions, so a room full of viewers costs one pass over the responses.
+@st.cache_resource(max_entries=2)
+def church_comparison(version, min_respondents):
+    metrics.count("cache_misses", cache="comparison")
+    with metrics.timer("comparison"):
+        return Comparison(load_table().stats_by_code(), min_respondents)
     
 # =========================
 # VISUALS
 # =========================
-colors = [
-    "#ff0000", "#ff4500", "#ff8c00", "#ffaa00", "#ffff00", "#ffff00", "#ffff00",
-    "#aaff00", "#55ff00", "#00ff00", "#008800"
-]
-cmap = LinearSegmentedColormap.from_list("health_scale", colors, N=256)
-
 def draw_custom_radar(scores, categories):
-    scores = list(scores)  # copy so we can append
-    avg_score = float(np.mean(scores))
-    angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False).tolist()
-    angles += angles[:1]
-    scores += scores[:1]
-
-    fig = plt.figure(figsize=(10, 11))
-    gs = fig.add_gridspec(2, 1, height_ratios=[0.9, 0.1])
-
-    ax_radar = fig.add_subplot(gs[0], polar=True)
-    ax_radar.set_theta_offset(np.pi / 2)
-    ax_radar.set_theta_direction(-1)
-    ax_radar.set_rlabel_position(0)
-    plt.xticks(angles[:-1], categories, fontsize=11)
-    plt.yticks([1, 3, 5, 7, 9], ["1", "3", "5", "7", "9"], color="grey", size=9)
-    plt.ylim(0, 10)
-
-    ax_radar.plot(angles, scores, 'o-', linewidth=2, color='#333333', alpha=0.7)
-    ax_radar.fill(angles, scores, color=cmap((avg_score - 1)/9.0), alpha=0.25)
-
-    for angle, score in zip(angles[:-1], scores[:-1]):
-        ax_radar.plot(angle, score, 'o', markersize=8, color=cmap((score - 1)/9.0))
-        ax_radar.annotate(
-            f"{score:.1f}",
-            xy=(angle, score + 0.3),
-            textcoords="offset points", xytext=(0, 5),
-            ha='center', fontsize=9, fontweight='bold',
-            bbox=dict(boxstyle="round,pad=0.2", fc=cmap((score - 1)/9.0), ec="black", alpha=0.7)
-        )
-
-    ax_radar.annotate(
-        f"Overall: {avg_score:.1f}/10",
-        xy=(0.5, 0.5), xycoords='axes fraction', ha='center',
-        fontsize=12, fontweight='bold',
-        bbox=dict(boxstyle="round,pad=0.3", fc=cmap((avg_score - 1)/9.0), ec="black", alpha=0.8)
-    )
-
-    ax_radar.plot(angles, [5.5]*len(angles), '--', color='#ffaa00', alpha=0.7)
-    ax_radar.plot(angles, [8.5]*len(angles), '--', color='#00aa00', alpha=0.7)
-    ax_radar.set_title("Church Health Assessment", fontsize=15, pad=20, fontweight='bold')
-
-    ax_cont = fig.add_subplot(gs[1])
-    gradient = np.linspace(1, 10, 256).reshape(1, 256)
-    ax_cont.imshow(gradient, aspect='auto', cmap=cmap, extent=[1, 10, 0, 1])
-    ax_cont.set_xlim(1, 10)
-    ax_cont.set_xticks([1, 5.5, 8.5, 10])
-    ax_cont.set_xticklabels(["1", "5.5", "8.5", "10"], fontsize=9)
-    ax_cont.set_yticks([])
-    ax_cont.axvline(x=5.5, color='white', linestyle='-', linewidth=1.5, alpha=0.9)
-    ax_cont.axvline(x=8.5, color='white', linestyle='-', linewidth=1.5, alpha=0.9)
-    ax_cont.set_title("Health Continuum Reference", fontsize=10, pad=8)
-
-    st.pyplot(fig)
-
-def classify(average):
-    if average >= 8.5:
-        return ("Thriving Health",
-                "Consistently reflects New Testament church characteristics")
-    elif average >= 7.5:
-        return ("Stable Health",
-                "Healthy foundation with clear growth opportunities")
-    elif average >= 6.5:
-        return ("Moderate Concerns",
-                "Several vulnerabilities requiring focused discipleship")
-    elif average >= 5.5:
-        return ("Significant Issues",
-                "Multiple areas need urgent attention; sustainability concerns")
+    if st.secrets["app"].get("radar_renderer", "svg") == "png":
+        from radar import render_radar  # matplotlib is only loaded for the PNG renderer
+        st.image(render_radar(scores, categories), width='stretch')
     else:
-        return ("Critical Condition",
-                "Comprehensive renewal needed; reflects fundamental spiritual health problems")
+        st.image(render_radar_svg(scores, categories), width='stretch')
+
+def draw_score_distribution(hist, categories, threshold=5.5):
+    median = hist.median()
+    lower, upper = hist.quantile(0.25), hist.quantile(0.75)
+    below = hist.share_below(threshold)
+    st.dataframe(
+        [
+            {"Virtue": name, "Scores 1–10": counts.tolist(), "Median": float(median[i]),
+             "Middle half": f"{lower[i]:g}–{upper[i]:g}", f"Below {threshold:g}": float(below[i]) * 100}
+            for i, (name, counts) in enumerate(zip(categories, hist.counts))
+            if counts.any()
+        ],
+        column_config={
+            "Scores 1–10": st.column_config.BarChartColumn("Scores 1–10", y_min=0),
+            f"Below {threshold:g}": st.column_config.ProgressColumn(
+                f"Below {threshold:g}", min_value=0, max_value=100, format="%.0f%%"
+            ),
+        },
+        hide_index=True
+    )
 
 # =========================
 # APP SETUP
 # =========================
 st.set_page_config(page_title="H.E.A.L.T.H.Y. Church Checklist", layout="centered")
+rerun_started = time.perf_counter()
+setup_metrics()
 
-# --- Centered Logo (PNG, works locally) ---
-with open("GCMTC_LogoTeal.png", "rb") as f:
-    img_data = f.read()
-encoded = base64.b64encode(img_data).decode()
+@st.cache_resource  # read and prepared once per process, not on every rerun
+def static_assets():
+    from PIL import Image
+    with open("GCMTC_LogoTeal.png", "rb") as f:
+        logo_uri = "data:image/png;base64," + base64.b64encode(f.read()).decode()
+    qr = BytesIO()
+    with Image.open("app_qr.png") as img:
+        img.resize((250, 250)).save(qr, format="PNG")  # width x height in pixels
+    return logo_uri, qr.getvalue()
+
+logo_uri, qr_png = static_assets()
 
+# --- Centered Logo (PNG, works locally) ---
 st.markdown(
     f"""
     <div style="text-align: center;">
-        <img src="data:image/png;base64,{encoded}" alt="Organization Logo" width="300">
+        <img src="{logo_uri}" alt="Organization Logo" width="300">
     </div>
     """,
     unsafe_allow_html=True
@@ -181,82 +213,6 @@ st.markdown(
 )
 st.divider()
 
-# =========================
-# SURVEY QUESTIONS
-# =========================
-questions = [
-    {
-        "label": "<b>HUMILITY</b> (<i>Mababang loob o Mapagpakumbaba</i>)",
-        "description": "The posture of the heart that recognizes one’s complete dependence on God, placing His will above personal pride, ambition, or self-sufficiency. It is the acknowledgement that all wisdom, strength, and provision come from Him (James 4:6; Philippians 2:3–8; Matthew 5:5), and therefore one lives not for self-exaltation but for God’s glory and the good of others. Humility is expressed through obedience to God, service to others, a teachable spirit, and a willingness to submit rather than dominate. It reflects the character of Christ, who, though equal with God, emptied Himself and became a servant, ultimately modeling perfect humility in His life, death, and resurrection.",
-        "anchors": [
-            "A spirit of competition, boasting, or arrogance dominates, especially in board meetings. Members rarely apologize or seek reconciliation when conflicts arise.",
-            "Leaders and members sometimes seek forgiveness and reconciliation, though these behaviors are rarely noticed.",
-            "Members consistently value others above themselves, act with gentleness, respect, and courtesy, and seek reconciliation when conflicts arise."
-        ]
-    },
-    {
-        "label": "<b>ENDURANCE in the Faith</b> (<i>Matiyagang nagpapatuloy, Nananatiling tapat, o Nagtitiyaga hanggang wakas</i>)",
-        "description": "Endurance in the faith is the steadfast perseverance to remain faithful to God and His promises despite trials, suffering, or opposition. It is the spiritual strength to press on in obedience and hope, trusting that God is working all things for good and that His reward is sure. Scripture exhorts believers to “run with perseverance the race marked out for us, fixing our eyes on Jesus” (Hebrews 12:1–2), to “rejoice in our sufferings, knowing that suffering produces endurance” (Romans 5:3–4), and to remain steadfast under trial, for “when he has stood the test he will receive the crown of life” (James 1:12, 1Corinthians 13:7). Endurance, therefore, is both a gift of God’s sustaining grace and the believer’s faithful response to keep walking with Christ until the end.",
-        "anchors": [
-            "People leave or disengage when challenges arise. Ministry participation is minimal or conditional.",
-            "Members tend to participate only when convenient and rarely persevere through difficulties or changes.",
-            "The community demonstrates consistent faithfulness, perseverance, adaptability, and willingness to serve despite difficulty or personal sacrifice."
-        ]
-    },
-    {
-        "label": "<b>AUTHENTICITY</b> (<i>Pusong Dalisay, malinis na budhi, at tapat na pananampalataya o mabuting loob</i>)",
-        "description": "Authenticity is living with integrity and sincerity before God and others, where one’s inner life aligns with outward actions. It is the opposite of hypocrisy, calling believers to be genuine in faith, speech, and conduct, reflecting the truth of Christ within them. Scripture reminds us to live in the light, for “whoever lives by the truth comes into the light, so that it may be seen plainly that what they have done has been done in the sight of God” (John 3:21), and to “let love be genuine” (Romans 12:9). Authenticity means walking in truth (3 John 1:4, 1 Timothy 1:5), confessing weaknesses honestly, and allowing God’s Spirit to shape a life that is real, transparent, and consistent with the gospel.",
-        "anchors": [
-            "Attendance is mostly habitual or for appearances; kindness, generosity, and public testimonies are minimal.",
-            "Members show support, encouragement, and eagerness to have fellowship with one another, though these behaviors are not yet consistent.",
-            "Members show kindness, hospitality, and mercy. They support, encourage, and pray for one another, visit the sick, and assist those in need."
-        ]
-    },
-    {
-        "label": "<b>LOVE</b> (<i>Pag-ibig</i>)",
-        "description": "Love is the highest virtue and the defining mark of the Christian life, as beautifully described in 1 Corinthians 13. It is not merely an emotion but a selfless commitment to seek the good of others, grounded in God’s own love. Paul teaches that love is patient and kind; it does not envy, boast, or act with pride. It is not rude, self-seeking, or easily angered, and it keeps no record of wrongs. Love rejoices with the truth, always protects, always trusts, always hopes, and always perseveres (1 Corinthians 13:4–7). Unlike gifts or accomplishments that will pass away, love is eternal, for “the greatest of these is love” (1 Corinthians 13:13).",
-        "anchors": [
-            "Hostility, factions, or selfish ambition are present; relationships are strained or divisive.",
-            "Members are generally amicable and respectful, but relationships lack depth or sustained care.",
-            "Members show love for one another, enjoy fellowship, share resources, pray for each other, and participate in communal activities beyond the confines of the church building."
-        ]
-    },
-    {
-        "label": "<b>TRUSTWORTHINESS</b> (<i>Mapagkakatiwalaan</i>)",
-        "description": "Trustworthiness is the quality of being faithful, reliable, and dependable in character and action, reflecting the steadfastness of God Himself. Scripture calls believers to let their “Yes” be yes and their “No” be no (Matthew 5:37), showing integrity in word and deed. A trustworthy person keeps promises, fulfills responsibilities, and acts with honesty, echoing the wisdom of Proverbs 12:22: “The Lord detests lying lips, but he delights in people who are trustworthy.” Ultimately, trustworthiness is rooted in God’s faithfulness (Lamentations 3:22–23), and believers are called to mirror His character by living with integrity so that others may confidently depend on their word and witness.",
-        "anchors": [
-            "Mistrust and suspicion dominate; contempt or open criticism is common.",
-            "Some discord exists, but most members generally respect and affirm leadership.",
-            "The congregation fully trusts leadership, and leaders consistently demonstrate integrity and biblical alignment in life and ministry."
-        ]
-    },
-    {
-        "label": "<b>HARMONY</b> (<i>Pakikiisa at Nagkaisa</i>)",
-        "description": "Harmony or peace within a community of believers is the unity and mutual love that flows from Christ’s reconciling work, binding diverse people together as one body under His lordship. Believers are called to “make every effort to keep the unity of the Spirit through the bond of peace” (Ephesians 4:3) and to “live in harmony with one another” (Romans 12:16), showing patience, forgiveness, and compassion. This peace is not merely the absence of conflict but the active presence of reconciliation, encouragement, and shared life in Christ, who Himself is our peace (Ephesians 2:14). When believers “let the peace of Christ rule in [their] hearts” (Colossians 3:15), the church becomes a living testimony of God’s kingdom marked by love, unity, and mutual upbuilding.",
-        "anchors": [
-            "Gossip, jealousy, unresolved conflicts, or division are common.",
-            "Past conflicts may remain unresolved, but members are increasingly sensitive to reconciliation and avoiding repeated mistakes.",
-            "Conflicts are addressed with forgiveness and understanding. Members and leaders apologize readily, maintain peace, and cultivate strong relational bonds."
-        ]
-    },
-    {
-        "label": "<b>YEARNING for Truth</b> (<i>Kinagagalak ang katotohanan</i>)",
-        "description": "Yearning for truth is the deep longing of the heart to know, embrace, and live according to God’s Word, for He Himself is the source of all truth. Scripture teaches that Jesus is “the way, the truth, and the life” (John 14:6), and those who belong to Him are called to seek His truth earnestly, like the psalmist who prays, “Teach me your way, Lord, that I may rely on your faithfulness; give me an undivided heart, that I may fear your name” (Psalm 86:11, 1 Corinthians 13:6). This yearning is expressed in a hunger for God’s Word (Psalm 119:105, 160), a desire to walk in integrity, and a willingness to reject falsehood and deception. It is the Spirit of truth (John 16:13) who guides believers into a deeper knowledge of Christ, shaping them to love truth and live by it in every aspect of life.",
-        "anchors": [
-            "Members show little interest in Scripture, prayer, or personal spiritual growth.",
-            "Members engage in discipleship, and other faith-building activities, though their participation and personal practice are not yet consistent.",
-            "Members actively seek to learn, study Scripture, grow in faith, disciple others, and apply biblical principles in daily life."
-        ]
-    }
-]
-
-main_virtues = []
-for q in questions:
-    cleaned = clean_label(q["label"])
-    # if you only want the first part (before parentheses)
-    virtue = cleaned.split("(")[0].strip()
-    main_virtues.append(virtue)
-
 st.markdown("""
 ## 🙏 Welcome to the **Church Health Assessment App**
 
@@ -306,11 +262,8 @@ with st.expander("📖 How to Use the App"):
 """)
 
     st.markdown("**📱 Scan QR code to open the app directly:**")
-    img = Image.open("app_qr.png")
-    img = img.resize((250, 250))  # width x height in pixels
-
     # Display the static QR code image
-    st.image(img, caption="H.E.A.L.T.H.Y. Church App")
+    st.image(qr_png, caption="H.E.A.L.T.H.Y. Church App")
     #st.image("app_qr.png", caption="Scan to open the H.E.A.L.T.H.Y. Church Checklist App", width='stretch')
        
 # =========================
@@ -329,11 +282,16 @@ def reset_session():
     st.session_state.church_code = ""
     st.session_state.control_id = ""
 
+# Each stage and each panel under "Other Options" is a fragment: typing,
+# clicking or uploading inside one reruns just that panel. Anything that
+# moves to another stage calls st.rerun(), which reruns the whole page.
+
 # =========================
 # STAGE: Await Church Code
 # =========================
-if st.session_state.stage == "await_code":
-       
+@st.fragment
+@metrics.timed("stage.await_code")
+def await_code_stage():
     code = st.text_input(
         "Enter your Church Code (existing or new; responses and results will be linked to this code).",
         value=st.session_state.church_code
@@ -364,7 +322,9 @@ if st.session_state.stage == "await_code":
 # =========================
 # STAGE: Optional Control ID
 # =========================
-elif st.session_state.stage == "control_input":
+@st.fragment
+@metrics.timed("stage.control_input")
+def control_input_stage():
     st.info("Optional: Enter a Control ID provided by your church.")
     with st.form("control_form"):
         control_id_input = st.text_input("Control ID (leave blank for casual or personal survey or just exploring)", value=st.session_state.control_id)
@@ -381,16 +341,12 @@ elif st.session_state.stage == "control_input":
             else:
                 # Check for duplicate
                 try:
-                    data = load_data()
-                    df = pd.DataFrame(data)
-                    df["Control_ID"] = df["Control_ID"].astype(str).str.strip()
-                    df["Code"] = df["Code"].astype(str).str.strip()
-                    duplicate = df[(df["Code"] == st.session_state.church_code) & (df["Control_ID"] == control_id_input)]
+                    duplicate = get_store().has_control_id(st.session_state.church_code, control_id_input)
                 except Exception as e:
                     st.error(f"Could not fetch existing responses: {e}")
                     st.stop()
 
-                if not duplicate.empty:
+                if duplicate:
                     st.warning(f"⚠️ Control ID '{control_id_input}' has already been used for Church Code '{st.session_state.church_code}'.")
                 else:
                     st.session_state.control_id = control_id_input
@@ -404,7 +360,9 @@ elif st.session_state.stage == "control_input":
 # =========================
 # STAGE: Survey Form
 # =========================
-elif st.session_state.stage == "survey":
+@st.fragment
+@metrics.timed("stage.survey")
+def survey_stage():
     st.subheader("📋 Questionnaire")
 
     # Survey instructions and visual
@@ -469,35 +427,38 @@ Within each range, lower numbers mean worse health and higher numbers mean bette
 
             if success:
                 st.success("✅ Your response has been submitted!")
-                # Clear cached data so next read fetches updated Google Sheet
-                st.cache_data.clear()
                 st.session_state.stage = "results"
                 st.rerun()
 
 # =========================
 # STAGE: Results
 # =========================
-elif st.session_state.stage == "results":
+@st.fragment
+@metrics.timed("stage.results")
+def results_stage():
     try:
-        data = load_data()
-        df = pd.DataFrame(data)
-        df["Code"] = df["Code"].astype(str).str.strip()
-        df["Control_ID"] = df["Control_ID"].astype(str).str.strip()
-        df_code = df[df["Code"] == st.session_state.church_code]
-
-        if not df_code.empty:
-            avg_scores = df_code[[f"Q{i}" for i in range(1, 8)]].mean().tolist()
+        table = load_table()
+        stats = table.code_stats(st.session_state.church_code)
+
+        if stats.n:
+            avg_scores = stats.means().tolist()
             average = float(np.mean(avg_scores))
             classification, interpretation = classify(average)
 
             st.header("📊 Aggregated Results")
-            st.markdown(f"**Number of Respondents (Code {st.session_state.church_code}):** {len(df_code)}")
+            st.markdown(f"**Number of Respondents (Code {st.session_state.church_code}):** {stats.n}")
             st.markdown(f"**Average Score (Q1–Q7):** {average:.2f}")
             st.write(f"**Health Status:** _{classification}_")
             st.write(f"**Interpretation:** {interpretation}")
 
             st.subheader("🕸️ Church Health Overview")
             draw_custom_radar(avg_scores, main_virtues)
+
+            # averages hide a congregation split between very high and very low scores
+            st.subheader("📶 Score Distribution")
+            st.caption("How many respondents gave each score, the median and middle half of the scores, "
+                       "and the share below 5.5 (significant issues or worse).")
+            draw_score_distribution(table.code_histogram(st.session_state.church_code), main_virtues)
         else:
             st.warning("⚠️ No responses yet for this Church Code.")
 
@@ -509,6 +470,13 @@ elif st.session_state.stage == "results":
         reset_session()
         st.rerun()
 
+{
+    "await_code": await_code_stage,
+    "control_input": control_input_stage,
+    "survey": survey_stage,
+    "results": results_stage,
+}[st.session_state.stage]()
+
 st.divider()
 
 # =========================
@@ -517,18 +485,12 @@ st.divider()
 if "expander_open" not in st.session_state:
     st.session_state.expander_open = False
 
-# Render the expander
-with st.expander(
-    "⚙️ Other Options for Viewing/Filtering Results (Optional)",
-    expanded=st.session_state.expander_open
-) as exp:
-    
-    # Update session_state whenever user toggles the expander
-    #st.session_state.expander_open = exp.expanded  # works in Streamlit >=1.25
-
-    # ------------------------
-    # 1️⃣ Filter by Date
-    # ------------------------
+# ------------------------
+# 1️⃣ Filter by Date
+# ------------------------
+@st.fragment
+@metrics.timed("panel.date_filter")
+def date_filter_panel():
     st.subheader("1️⃣ Filter Survey Results by Date")
     st.info("View aggregated results for a Church Code within a specific date range.")
 
@@ -547,26 +509,19 @@ with st.expander(
             st.warning("⚠️ Please select a valid date range (start date must be before end date).")
         else:
             try:
-                data = load_data()
-                df = pd.DataFrame(data)
-                df["Code"] = df["Code"].astype(str).str.strip()
-                df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce")
-
-                df_code = df[df["Code"] == date_filter_code.strip()]
-                start_dt = pd.to_datetime(start_date)
-                end_dt = pd.to_datetime(end_date) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-                df_filtered = df_code[(df_code["Timestamp"] >= start_dt) & (df_code["Timestamp"] <= end_dt)]
+                # per-day aggregates, timestamps were parsed when the rows were loaded
+                stats = load_table().code_stats_between(date_filter_code, start_date, end_date)
 
-                if df_filtered.empty:
+                if not stats.n:
                     st.warning("⚠️ No responses found for this Church Code in the selected date range.")
                 else:
-                    avg_scores = df_filtered[[f"Q{i}" for i in range(1, 8)]].mean().tolist()
+                    avg_scores = stats.means().tolist()
                     average = float(np.mean(avg_scores))
                     classification, interpretation = classify(average)
 
                     st.header(f"📊 Aggregated Results for {date_filter_code.strip()}")
                     st.markdown(f"**Date Range:** {start_date.strftime('%Y-%m-%d')} - {end_date.strftime('%Y-%m-%d')}")
-                    st.markdown(f"**Number of respondents:** {len(df_filtered)}")
+                    st.markdown(f"**Number of respondents:** {stats.n}")
                     st.markdown(f"**Average Score (Q1–Q7):** {average:.2f}")
                     st.write(f"**Health Status:** _{classification}_")
                     st.write(f"**Interpretation:** {interpretation}")
@@ -575,11 +530,12 @@ with st.expander(
             except Exception:
                 st.warning("⚠️ Please select a valid range.")
 
-    st.divider()
-
-    # ------------------------
-    # 2️⃣ Filter by Church Code & Control ID
-    # ------------------------
+# ------------------------
+# 2️⃣ Filter by Church Code & Control ID
+# ------------------------
+@st.fragment
+@metrics.timed("panel.control_ids")
+def control_id_panel():
     st.subheader("2️⃣ Filter Survey Results by Church Code and Control ID")
     uploaded_ids = st.file_uploader(
         "📂 Upload a file containing **Code** (for Church Code) and **Control_ID**",
@@ -588,49 +544,46 @@ with st.expander(
     )
 
     if uploaded_ids:
-        if uploaded_ids.name.endswith(".csv"):
-            df_upload = pd.read_csv(uploaded_ids)
-        else:
-            df_upload = pd.read_excel(uploaded_ids)
-
-        df_upload.columns = df_upload.columns.str.strip().str.lower()
-        if "church_code" in df_upload.columns and "code" not in df_upload.columns:
-            df_upload.rename(columns={"church_code": "code"}, inplace=True)
-
-        required_cols = {"code", "control_id"}
-        if not required_cols.issubset(set(df_upload.columns)):
-            st.error("⚠️ Invalid file. Must contain columns: Code and Control_ID.")
+        try:
+            digest = file_digest(uploaded_ids)
+            metrics.count("cache_requests", cache="control_id_upload")
+            pairs, codes = parse_control_id_upload(uploaded_ids.name, digest, uploaded_ids)
+        except UploadError as e:
+            st.error(str(e))
         else:
-            st.success(f"✅ File accepted. {len(df_upload)} control IDs loaded.")
-            data = load_data()
-            df_sheet = pd.DataFrame(data)
-            df_sheet.columns = df_sheet.columns.str.strip().str.lower()
-            merged = df_sheet.merge(df_upload, on=["code", "control_id"], how="inner")
+            st.success(f"✅ File accepted. {len(pairs)} control IDs loaded.")
+            table = load_table()
+            versions = tuple(table.code_version(code) for code in codes)
+            metrics.count("cache_requests", cache="control_id_match")
+            stats, code_counts, unmatched = match_control_ids(digest, versions, pairs)
 
-            if merged.empty:
+            if not stats.n:
                 st.warning("⚠️ No matching respondents found in Google Sheet.")
             else:
-                q_cols = [f"q{i}" for i in range(1, 8)]
-                avg_scores = merged[q_cols].mean().tolist()
+                avg_scores = stats.means().tolist()
                 average = float(np.mean(avg_scores))
                 classification, interpretation = classify(average)
-                code_counts = merged['code'].value_counts()
-                formatted_codes = ", ".join([f"{code} ({count})" for code, count in code_counts.items()])
+                formatted_codes = ", ".join([f"{code} ({count})" for code, count in code_counts.most_common()])
 
                 st.header("📊 Results (Filtered by Uploaded List)")
                 st.info(f"Church Code(s) used: **{formatted_codes}**")
-                st.write(f"Number of respondents: {len(merged)}")
+                st.write(f"Number of respondents: {stats.n}")
+                if unmatched:
+                    shown = ", ".join(f"{code}/{control_id}" for code, control_id in unmatched[:20])
+                    more = f" and {len(unmatched) - 20} more" if len(unmatched) > 20 else ""
+                    st.caption(f"⚠️ {len(unmatched)} uploaded Control ID(s) have no response yet: {shown}{more}")
                 st.markdown(f"**Average Score (Q1–Q7):** {average:.2f}")
                 st.write(f"**Health Status:** _{classification}_")
                 st.write(f"**Interpretation:** {interpretation}")
                 st.subheader("🕸️ Church Health Overview")
                 draw_custom_radar(avg_scores, main_virtues)
 
-    st.divider()
-
-    # ------------------------
-    # 3️⃣ Upload Survey Results (Q1–Q7)
-    # ------------------------
+# ------------------------
+# 3️⃣ Upload Survey Results (Q1–Q7)
+# ------------------------
+@st.fragment
+@metrics.timed("panel.survey_upload")
+def survey_upload_panel():
     st.subheader("3️⃣ View Direct Survey Results (Upload File)")
     uploaded_file = st.file_uploader(
         "📂 Upload a file (.xls, .xlsx, .csv) containing ONLY the columns Q1–Q7",
@@ -639,39 +592,190 @@ with st.expander(
     )
 
     if uploaded_file:
-        if uploaded_file.name.endswith(".csv"):
-            df = pd.read_csv(uploaded_file)
-        else:
-            df = pd.read_excel(uploaded_file)
-
-        df.rename(columns=lambda x: x.strip().lower(), inplace=True)
-        expected_cols = [f"q{i}" for i in range(1, 8)]
-
-        if list(df.columns) != expected_cols:
-            st.error(
-                f"⚠️ Invalid file format. Must contain ONLY these columns in order: {', '.join([c.upper() for c in expected_cols])}"
-            )
+        try:
+            metrics.count("cache_requests", cache="survey_upload")
+            stats = parse_survey_upload(uploaded_file.name, file_digest(uploaded_file), uploaded_file)
+        except UploadError as e:
+            st.error(str(e))
         else:
-            df.columns = [c.upper() for c in df.columns]
-            avg_scores = df[df.columns].mean().tolist()
+            avg_scores = stats.means().tolist()
             average = float(np.mean(avg_scores))
             classification, interpretation = classify(average)
 
             st.header("📊 Results (from uploaded file)")
-            st.write(f"Number of respondents: {len(df)}")
+            st.write(f"Number of respondents: {stats.n}")
             st.markdown(f"**Average Score (Q1–Q7):** {average:.2f}")
             st.write(f"**Health Status:** _{classification}_")
             st.write(f"**Interpretation:** {interpretation}")
             st.subheader("🕸️ Church Health Overview")
             draw_custom_radar(avg_scores, main_virtues)
 
+# ------------------------
+# 4️⃣ Compare with Other Churches
+# ------------------------
+COHORT_CHOICES = {
+    "All churches": "all",
+    "Churches with the same Health Status": "tier",
+    "Church Codes starting with…": "prefix",
+}
+
+@st.fragment
+@metrics.timed("panel.comparison")
+def comparison_panel():
+    st.subheader("4️⃣ Compare with Other Churches")
+    st.info("See where a church stands among the others: for each virtue, the share of churches scoring lower.")
+
+    compare_code = st.text_input(
+        "Enter Church Code to compare",
+        value=st.session_state.church_code,
+        key="compare_code"
+    )
+    cohort_choice = st.selectbox("Compare with", list(COHORT_CHOICES), key="compare_cohort")
+    prefix = ""
+    if COHORT_CHOICES[cohort_choice] == "prefix":
+        prefix = st.text_input("Church Code prefix (e.g. ABC2025)", key="compare_prefix")
+
+    if st.button("📈 Compare", key="compare_btn"):
+        min_respondents = int(st.secrets["app"].get("comparison_min_respondents", 5))
+        if not compare_code.strip():
+            st.warning("⚠️ Please enter a Church Code to compare.")
+            return
+        try:
+            metrics.count("cache_requests", cache="comparison")
+            comparison = church_comparison(load_table().version, min_respondents)
+        except Exception as e:
+            st.error(f"Could not fetch results: {e}")
+            return
+        if compare_code not in comparison:
+            st.warning(f"⚠️ Only churches with at least {min_respondents} responses are compared; "
+                       "this Church Code has fewer.")
+            return
+        cohort = comparison.cohort(compare_code, COHORT_CHOICES[cohort_choice], prefix)
+        if cohort.sum() < MIN_COHORT:
+            st.warning(f"⚠️ Fewer than {MIN_COHORT} churches to compare with; please choose a wider group.")
+            return
+
+        scores, ranks, medians, size = comparison.position(compare_code, cohort)
+        classification, interpretation = classify(scores[-1])
+        st.header(f"📈 {compare_code.strip()} Compared with {size} Churches")
+        st.caption(f"Churches with fewer than {min_respondents} responses are left out "
+                   f"({comparison.suppressed} in all).")
+        st.markdown(f"**Average Score (Q1–Q7):** {scores[-1]:.2f} "
+                    f"(group median {medians[-1]:.2f}, higher than {ranks[-1]:.0f}% of them)")
+        st.write(f"**Health Status:** _{classification}_")
+        st.dataframe(
+            [
+                {"Virtue": name, "Score": round(float(score), 2), "Group median": round(float(median), 2),
+                 "Higher than": round(float(rank))}
+                for name, score, median, rank in zip(main_virtues, scores, medians, ranks)
+                if not np.isnan(rank)
+            ],
+            column_config={"Higher than": st.column_config.ProgressColumn(
+                "Higher than", help="Share of the other churches in the group scoring lower",
+                min_value=0, max_value=100, format="%d%%"
+            )},
+            hide_index=True
+        )
 
+# ------------------------
+# 5️⃣ Results Over Time
+# ------------------------
+@st.fragment
+@metrics.timed("panel.trend")
+def trend_panel():
+    st.subheader("5️⃣ Track Results Over Time")
+    st.info("See whether a church's scores are improving between survey waves, month by month or week by week.")
+
+    trend_code = st.text_input(
+        "Enter Church Code to track",
+        value=st.session_state.church_code,
+        key="trend_code"
+    )
+    unit = st.radio("Group responses by", ["Month", "Week"], horizontal=True, key="trend_unit")
 
+    if st.button("📉 View Trend", key="trend_btn"):
+        if not trend_code.strip():
+            st.warning("⚠️ Please enter a Church Code to track.")
+            return
+        try:
+            # from the per-day aggregates: one subtraction per period, whatever the number of responses
+            periods = load_table().code_trend(trend_code, unit.lower())
+        except Exception as e:
+            st.error(f"Could not fetch results: {e}")
+            return
+        if not periods:
+            st.warning("⚠️ No responses found for this Church Code.")
+            return
+
+        import pandas as pd  # only once a trend is asked for
+        averages = [float(np.mean(stats.means())) for _, stats in periods]
+        trend = pd.DataFrame(
+            [stats.means() for _, stats in periods], columns=main_virtues,
+            index=pd.DatetimeIndex([first for first, _ in periods], name=unit)
+        )
+        trend["Average"] = averages
+
+        st.header(f"📉 Results Over Time for {trend_code.strip()}")
+        st.line_chart(trend, y_label="Score (1–10)")
+        label = "%B %Y" if unit == "Month" else "Week of %Y-%m-%d"
+        st.dataframe(
+            [
+                {unit: first.strftime(label), "Respondents": stats.n, "Average": round(average, 2),
+                 "Health Status": classify(average)[0]}
+                for (first, stats), average in zip(periods, averages)
+            ],
+            hide_index=True
+        )
 
+# Render the expander
+with st.expander(
+    "⚙️ Other Options for Viewing/Filtering Results (Optional)",
+    expanded=st.session_state.expander_open
+) as exp:
+    
+    # Update session_state whenever user toggles the expander
+    #st.session_state.expander_open = exp.expanded  # works in Streamlit >=1.25
 
+    date_filter_panel()
+    st.divider()
+    control_id_panel()
+    st.divider()
+    survey_upload_panel()
+    st.divider()
+    comparison_panel()
+    st.divider()
+    trend_panel()
 
+# =========================
+# ADMIN DIAGNOSTICS
+# =========================
+@st.fragment
+def admin_panel():
+    st.subheader("🛠️ Diagnostics")
+    st.button("🔄 Refresh", key="admin_refresh")
+    snap = metrics.snapshot()
+    values = snap["values"]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Responses loaded", f"{values.get('table_rows', 0):,}")
+    col2.metric("Table memory", f"{values.get('table_memory_bytes', 0) / 2**20:.1f} MiB")
+    col3.metric("Submissions queued", values.get("spool_pending_rows", 0))
+
+    st.markdown("**Stage timings** (recent runs)")
+    st.dataframe(
+        [{"stage": stage, **{k: round(v, 2) for k, v in s.items()}} for stage, s in snap["stages"].items()],
+        hide_index=True
+    )
+    st.markdown("**Counters** (since the process started)")
+    st.dataframe([{"counter": name, "value": value} for name, value in snap["counters"].items()], hide_index=True)
+    st.markdown("**Response table memory (bytes)**")
+    st.json(get_store().table.memory_usage())
+    with st.expander("Prometheus text"):
+        st.code(metrics.prometheus(), language="text")
+
+admin_key = st.secrets["app"].get("admin_key", "")
+if admin_key and hmac.compare_digest(str(st.query_params.get("admin", "")), str(admin_key)):
+    st.divider()
+    admin_panel()
 
-
-
-
-
+if metrics.sampled():
+    metrics.observe("rerun", time.perf_counter() - rerun_started)
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+Benchmarks for the app's hot paths on synthetic response sheets.
+
+    python benchmark.py                         # 1k, 10k and 100k rows
+    python benchmark.py --sizes 1000000 --repeat 3
+    python benchmark.py --json bench.json       # also save the numbers
+
+Rows are generated in the layout append_response() writes (Timestamp, Code,
+Control_ID, Q1..Q7) and served by FakeWorksheet, an in-memory stand-in for
+the gspread worksheet, so SheetsStore runs its real sync code without any
+network. For every size the suite times the full sync a fresh process does,
+an incremental sync, the results-page aggregates, the date filter, the
+monthly trend, the Control ID match and both upload paths, and reports
+latency percentiles and the peak memory (tracemalloc) of one extra run. The
+radar renderers don't depend on the sheet size and are timed once.
+
+Same seed, same sheet: numbers are comparable between commits.
+"""
+
+import argparse
+import csv
+import io
+import json
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from gspread.utils import a1_to_rowcol
+
+from aggregates import QUESTIONS
+from responses import HEADER, TIME_FORMAT
+
+
+def synthetic_rows(n, per_code=40, control_share=0.5, days=365, seed=0, start=datetime(2025, 1, 1)):
+    """n sheet rows (as strings, like get_values() returns them), oldest first.
+
+    Churches get per_code respondents on average; control_share of them run
+    official surveys with a unique Control ID per respondent. Timestamps are
+    spread over the given number of days.
+    """
+    rng = np.random.default_rng(seed)
+    n_codes = max(1, n // per_code)
+    codes = [f"CH{i:05d}" for i in range(n_codes)]
+    official = rng.random(n_codes) < control_share
+    health = rng.uniform(3, 9, size=(n_codes, len(QUESTIONS)))  # each church's typical scores
+
+    code_of = rng.integers(0, n_codes, size=n)
+    scores = np.clip(np.rint(health[code_of] + rng.normal(0, 1.5, size=(n, len(QUESTIONS)))), 1, 10).astype(int)
+    seconds = np.sort(rng.integers(0, days * 86400, size=n))
+    seen = np.zeros(n_codes, dtype=int)
+    rows = []
+    for i in range(n):
+        c = code_of[i]
+        control_id = ""
+        if official[c]:
+            seen[c] += 1
+            control_id = f"{codes[c]}-{seen[c]:05d}"
+        timestamp = (start + timedelta(seconds=int(seconds[i]))).strftime(TIME_FORMAT)
+        rows.append([timestamp, codes[c], control_id] + [str(s) for s in scores[i]])
+    return rows
+
+
+class FakeWorksheet:
+    """The few gspread Worksheet calls the stores make, served from a list."""
+
+    def __init__(self, rows):
+        self.values = [list(HEADER)] + [list(r) for r in rows]
+
+    def get_values(self, *args, **kwargs):
+        return [list(r) for r in self.values]
+
+    def batch_get(self, ranges, **kwargs):
+        return [self._range(r) for r in ranges]
+
+    def append_rows(self, rows, **kwargs):
+        self.values.extend([str(v) for v in r] for r in rows)
+
+    def _range(self, a1):
+        whole_rows = re.fullmatch(r"(\d+):(\d+)", a1)
+        if whole_rows:
+            first, last, width = int(whole_rows[1]), int(whole_rows[2]), None
+        else:
+            m = re.fullmatch(r"([A-Z]+)(\d+):([A-Z]+)(\d*)", a1)
+            first, last = int(m[2]), int(m[4]) if m[4] else len(self.values)
+            width = a1_to_rowcol(f"{m[3]}1")[1]
+        rows = []
+        for row in self.values[first - 1:last]:
+            row = list(row[:width])
+            while row and row[-1] == "":
+                row.pop()  # the API leaves out trailing blanks
+            rows.append(row)
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+
+class FakePool:
+    """Stands in for sheets.SheetPool: no auth, no quota, one worksheet."""
+
+    def __init__(self, worksheet):
+        self.sheet = worksheet
+
+    def call(self, fn, retry=True, wait=True, op="call"):
+        return fn(self.sheet)
+
+
+class NamedBytes(io.BytesIO):
+    """In-memory upload with a file name, like Streamlit's UploadedFile."""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+def survey_csv(rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(QUESTIONS)
+    writer.writerows(r[3:] for r in rows)
+    return NamedBytes(out.getvalue().encode(), "survey.csv")
+
+
+def survey_xlsx(rows):
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(QUESTIONS)
+    for r in rows:
+        sheet.append([int(v) for v in r[3:]])
+    out = io.BytesIO()
+    workbook.save(out)
+    return NamedBytes(out.getvalue(), "survey.xlsx")
+
+
+def control_id_csv(rows, share=0.1):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["Code", "Control_ID"])
+    writer.writerows(r[1:3] for i, r in enumerate(rows) if r[2] and i % round(1 / share) == 0)
+    return NamedBytes(out.getvalue().encode(), "control_ids.csv")
+
+
+def timed(fn, repeat):
+    """Seconds per call of fn(i) for i in range(repeat), then peak bytes of one more call."""
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn(repeat)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def result(rows, name, times, peak):
+    ms = np.array(times) * 1000
+    return {
+        "rows": rows, "name": name, "runs": len(times),
+        "p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+        "max_ms": float(ms.max()), "peak_mib": peak / 2**20,
+    }
+
+
+def bench_size(n, args, workdir):
+    from storage import SheetsStore
+    from uploads import control_id_pairs, survey_stats
+
+    rows = synthetic_rows(n, args.per_code, args.control_share, args.days, args.seed)
+    sheet = FakeWorksheet(rows)
+    stores = []
+
+    def new_store():
+        store = SheetsStore(FakePool(sheet), f"{workdir}/spool-{n}-{len(stores)}.db")
+        stores.append(store)
+        return store
+
+    results = []
+
+    def run(name, fn, repeat=args.repeat):
+        results.append(result(n, name, *timed(fn, repeat)))
+        print(_line(results[-1]), flush=True)
+
+    run("full sync (fresh process)", lambda i: new_store().refresh())
+    store = stores[-1]
+    table = store.table
+    codes = sorted({r[1] for r in rows})
+    rng = random.Random(args.seed)
+    extra = iter(synthetic_rows(10 * (args.repeat + 1), seed=args.seed + 1, start=datetime(2026, 1, 1)))
+
+    def incremental(i):
+        sheet.append_rows([next(extra) for _ in range(10)])
+        table.expire()
+        store.refresh()
+
+    run("incremental sync (+10 rows)", incremental)
+    queries = max(args.repeat, 100)
+    run("results: code_stats", lambda i: store.refresh().code_stats(rng.choice(codes)), queries)
+    first = date(2025, 1, 1)
+    run("date filter: 90 days", lambda i: store.refresh().code_stats_between(
+        rng.choice(codes), first + timedelta(days=i % 270), first + timedelta(days=i % 270 + 90)
+    ), queries)
+    run("trend: by month", lambda i: store.refresh().code_trend(rng.choice(codes)), queries)
+
+    ids_file = control_id_csv(rows)
+    run("upload: Control ID CSV", lambda i: control_id_pairs(ids_file))
+    pairs = control_id_pairs(ids_file)
+    run(f"Control ID match ({len(pairs)} ids)", lambda i: store.refresh().match_control_ids(pairs))
+
+    csv_file = survey_csv(rows)
+    run("upload: survey CSV", lambda i: survey_stats(csv_file))
+    if n <= args.xlsx_max_rows:
+        xlsx_file = survey_xlsx(rows)
+        run("upload: survey xlsx", lambda i: survey_stats(xlsx_file))
+    results[0]["table_mib"] = table.memory_usage()["total"] / 2**20
+    print(f"{n:>9,} {'response table in memory':<34} {results[0]['table_mib']:.1f} MiB", flush=True)
+    return results
+
+
+def bench_radar(args):
+    from radar import render_radar
+    from radar_svg import render_radar_svg
+
+    categories = [f"Category {i}" for i in range(1, len(QUESTIONS) + 1)]
+    rng = np.random.default_rng(args.seed)
+    # fresh scores every call so the renderers' caches don't hide the work
+    scores = rng.uniform(1, 10, size=(2 * args.repeat + 2, len(QUESTIONS))).round(2)
+    results = []
+    for name, render, offset in (("radar: SVG", render_radar_svg, 0), ("radar: PNG", render_radar, args.repeat + 1)):
+        results.append(result(0, name, *timed(lambda i: render(scores[offset + i], categories), args.repeat)))
+        print(_line(results[-1]), flush=True)
+    return results
+
+
+def _line(r):
+    return (f"{r['rows']:>9,} {r['name']:<34} p50 {r['p50_ms']:9.2f} ms  p95 {r['p95_ms']:9.2f} ms"
+            f"  max {r['max_ms']:9.2f} ms  peak {r['peak_mib']:8.1f} MiB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="sheet sizes in rows (up to 1000000)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per operation")
+    parser.add_argument("--per-code", type=int, default=40, help="average respondents per church code")
+    parser.add_argument("--control-share", type=float, default=0.5, help="share of churches using Control IDs")
+    parser.add_argument("--days", type=int, default=365, help="days the timestamps are spread over")
+    parser.add_argument("--xlsx-max-rows", type=int, default=100_000,
+                        help="skip the .xlsx upload above this size (building the file is slow)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in args.sizes:
+            results += bench_size(n, args, workdir)
+        results += bench_radar(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
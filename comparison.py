@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+Churches side by side, and where one of them stands among the others.
+
+A Comparison holds every church code's Q1–Q7 means, overall average and
+health status as arrays, built from ResponseTable.stats_by_code() (one pass
+over all responses). It is meant to be built once per data version and
+shared by everyone viewing it. Churches with fewer than min_respondents
+responses are left out: a handful of answers says little about a
+congregation.
+
+Percentile ranks against all compared churches are computed up front for
+every church at once. Narrower cohorts (same health status, codes sharing a
+prefix) are ranked on demand from the same arrays, never from the responses.
+A percentile here is the share of the other churches in the cohort scoring
+strictly lower; a church is never counted against itself.
+"""
+
+import numpy as np
+
+from aggregates import QUESTIONS
+from checklist import classify
+
+MIN_COHORT = 3  # fewer churches than this and a percentile gives their scores away
+
+
+class Comparison:
+    """Q1–Q7 means, averages, health status and percentile ranks of all churches."""
+
+    def __init__(self, stats_by_code, min_respondents=5):
+        self.min_respondents = min_respondents
+        self.codes = sorted(code for code, stats in stats_by_code.items() if code and stats.n >= min_respondents)
+        self.suppressed = sum(1 for code, stats in stats_by_code.items() if code and stats.n < min_respondents)
+        self._index = {code: i for i, code in enumerate(self.codes)}
+        self.n = np.array([stats_by_code[code].n for code in self.codes], dtype=np.int64)
+        self.means = np.array([stats_by_code[code].means() for code in self.codes]).reshape(-1, len(QUESTIONS))
+        self.average = self.means.mean(axis=1)  # as on the results page
+        self.tiers = np.array([classify(average)[0] for average in self.average.tolist()], dtype=object)
+        self.scores = np.column_stack([self.means, self.average])  # Q1–Q7 and the average
+        self.ranks = _percentile_ranks(self.scores, self.scores, among_members=True)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code.strip() in self._index
+
+    def cohort(self, code, by="all", prefix=""):
+        """Boolean mask of the other churches to compare a church with."""
+        i = self._index[code.strip()]
+        if by == "tier":
+            cohort = self.tiers == self.tiers[i]
+        elif by == "prefix":
+            prefix = prefix.strip().casefold()
+            cohort = np.array([c.casefold().startswith(prefix) for c in self.codes], dtype=bool)
+        else:
+            cohort = np.ones(len(self.codes), dtype=bool)
+        cohort[i] = False
+        return cohort
+
+    def position(self, code, cohort=None):
+        """Where one church stands in a cohort of others (default: all other compared churches).
+
+        Returns (its Q1–Q7 means and average, their percentile ranks, the
+        cohort's medians of the same, cohort size).
+        """
+        i = self._index[code.strip()]
+        if cohort is None:
+            cohort = self.cohort(code)
+        if cohort.sum() == len(self.codes) - 1 and not cohort[i]:
+            members, ranks = self.scores[cohort], self.ranks[i]
+        else:
+            members = self.scores[cohort]
+            ranks = _percentile_ranks(members, self.scores[i:i + 1])[0]
+        medians = np.array([np.median(column[~np.isnan(column)]) if (~np.isnan(column)).any() else np.nan
+                            for column in members.T])
+        return self.scores[i], ranks, medians, len(members)
+
+
+def _percentile_ranks(members, scores, among_members=False):
+    """Percent of members scoring lower than each row of scores, per column (NaN where unscored).
+
+    among_members: the rows of scores are the members themselves, and each
+    is compared with the others only.
+    """
+    ranks = np.full(scores.shape, np.nan)
+    for j in range(scores.shape[1]):
+        column = np.sort(members[:, j])
+        column = column[~np.isnan(column)]
+        valid = ~np.isnan(scores[:, j])
+        others = len(column) - 1 if among_members else len(column)
+        if others < 1 or not valid.any():
+            continue
+        ranks[valid, j] = np.searchsorted(column, scores[valid, j], side="left") / others * 100
+    return ranks
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+Process-wide counters and stage timings for diagnosing slow pages.
+
+Modules record into the shared `metrics` object: count() for events such as
+Sheets API calls, retries, 429s, cache misses and chart renders, and timer()
+around stages such as a sync, an upload parse or a rerun. Timers can be
+sampled (only a fraction of runs measured) to keep the overhead down on busy
+servers; counters are always exact. Values held by other objects (queue
+length, table size) are read when a report is made, through collect().
+
+Reports come as a dict (admin panel), Prometheus text exposition (also
+served over HTTP by serve()), or one JSON line per timing on stdout.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+PREFIX = "healthy_church_"
+
+
+class Metrics:
+    """Thread-safe registry of counters, timings and collected values."""
+
+    def __init__(self, window=1024):
+        self.enabled = True
+        self.sample_rate = 1.0  # share of timer() runs that are measured
+        self.log = False  # print a JSON line for every measured timing
+        self._window = window  # recent timings kept per stage for percentiles
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, sorted labels) -> value
+        self._timings = {}  # stage -> [count, total seconds, recent durations]
+        self._collectors = {}  # key -> fn returning {name: value}
+
+    def configure(self, enabled=True, sample_rate=1.0, log=False):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.log = log
+
+    def count(self, name, n=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            timing = self._timings.setdefault(stage, [0, 0.0, deque(maxlen=self._window)])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2].append(seconds)
+        if self.log:
+            print(json.dumps({"metric": stage, "seconds": round(seconds, 6), "time": round(time.time(), 3)}))
+
+    def sampled(self):
+        """Whether to measure this run of a stage."""
+        return self.enabled and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the enclosed block as `stage` (if this run is sampled)."""
+        if not self.sampled():
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage):
+        """Decorator form of timer()."""
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def collect(self, key, fn):
+        """Have fn() -> {name: value} read at report time (replaces any earlier fn for key)."""
+        with self._lock:
+            self._collectors[key] = fn
+
+    def snapshot(self):
+        with self._lock:
+            counters = {_series(name, labels): value for (name, labels), value in self._counters.items()}
+            timings = {stage: (count, total, np.array(recent)) for stage, (count, total, recent) in self._timings.items()}
+            collectors = list(self._collectors.values())
+        values = {}
+        for fn in collectors:
+            try:
+                values.update(fn())
+            except Exception as e:
+                print("Metrics collector failed:", e)
+        stages = {}
+        for stage, (count, total, recent) in sorted(timings.items()):
+            p50, p95, p99 = np.percentile(recent, [50, 95, 99]) if len(recent) else (np.nan,) * 3
+            stages[stage] = {
+                "count": count, "total_s": total, "p50_ms": p50 * 1000, "p95_ms": p95 * 1000,
+                "p99_ms": p99 * 1000, "max_ms": recent.max() * 1000 if len(recent) else np.nan,
+            }
+        return {"counters": dict(sorted(counters.items())), "stages": stages, "values": dict(sorted(values.items()))}
+
+    def prometheus(self):
+        """Everything in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = []
+        for series, value in snap["counters"].items():
+            lines.append(f"{PREFIX}{_with_suffix(series, '_total')} {value}")
+        for name, value in snap["values"].items():
+            lines.append(f"{PREFIX}{name} {value}")
+        if snap["stages"]:
+            lines.append(f"# TYPE {PREFIX}stage_seconds summary")
+        for stage, s in snap["stages"].items():
+            for q, key in ((0.5, "p50_ms"), (0.95, "p95_ms"), (0.99, "p99_ms")):
+                lines.append(f'{PREFIX}stage_seconds{{stage="{stage}",quantile="{q}"}} {s[key] / 1000:.6f}')
+            lines.append(f'{PREFIX}stage_seconds_sum{{stage="{stage}"}} {s["total_s"]:.6f}')
+            lines.append(f'{PREFIX}stage_seconds_count{{stage="{stage}"}} {s["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="0.0.0.0"):
+        """Serve prometheus() at http://host:port/metrics from a daemon thread."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # scrapes every few seconds would flood the app log
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def _with_suffix(series, suffix):
+    name, brace, labels = series.partition("{")
+    return name + suffix + brace + labels
+
+
+metrics = Metrics()
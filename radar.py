@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+Radar chart rendering for the results pages.
+
+The polar grid, tick labels, threshold rings, title and continuum bar never
+change for a given set of categories, so they are drawn once into a figure
+that stays alive for the whole process and its pixels are kept. Each chart
+restores those pixels and draws only the score polygon and labels on top.
+Finished PNGs are cached by (rounded scores, categories).
+
+radar_svg.py draws the same chart as SVG without matplotlib; this module is
+for when a raster image is wanted.
+
+Figures are created directly on the Agg canvas rather than through pyplot,
+so nothing is left registered with pyplot's figure manager.
+"""
+
+import threading
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.figure import Figure
+from PIL import Image
+
+from metrics import metrics
+from radar_svg import colors
+
+cmap = LinearSegmentedColormap.from_list("health_scale", colors, N=256)
+
+DPI = 150
+
+_lock = threading.Lock()  # the shared figures are not thread-safe
+_backgrounds = {}  # categories -> (figure, radar axes, angles, saved pixels)
+
+
+def _angles(n):
+    angles = np.linspace(0, 2 * np.pi, n, endpoint=False).tolist()
+    return angles + angles[:1]
+
+
+def _background(categories):
+    if categories in _backgrounds:
+        return _backgrounds[categories]
+
+    angles = _angles(len(categories))
+    fig = Figure(figsize=(10, 11), dpi=DPI)
+    canvas = FigureCanvasAgg(fig)
+    gs = fig.add_gridspec(2, 1, height_ratios=[0.9, 0.1])
+
+    ax_radar = fig.add_subplot(gs[0], polar=True)
+    ax_radar.set_theta_offset(np.pi / 2)
+    ax_radar.set_theta_direction(-1)
+    ax_radar.set_rlabel_position(0)
+    ax_radar.set_xticks(angles[:-1], list(categories), fontsize=11)
+    ax_radar.set_yticks([1, 3, 5, 7, 9], ["1", "3", "5", "7", "9"], color="grey", size=9)
+    ax_radar.set_ylim(0, 10)
+    ax_radar.set_autoscale_on(False)
+
+    ax_radar.plot(angles, [5.5]*len(angles), '--', color='#ffaa00', alpha=0.7)
+    ax_radar.plot(angles, [8.5]*len(angles), '--', color='#00aa00', alpha=0.7)
+    ax_radar.set_title("Church Health Assessment", fontsize=15, pad=20, fontweight='bold')
+
+    ax_cont = fig.add_subplot(gs[1])
+    gradient = np.linspace(1, 10, 256).reshape(1, 256)
+    ax_cont.imshow(gradient, aspect='auto', cmap=cmap, extent=[1, 10, 0, 1])
+    ax_cont.set_xlim(1, 10)
+    ax_cont.set_xticks([1, 5.5, 8.5, 10])
+    ax_cont.set_xticklabels(["1", "5.5", "8.5", "10"], fontsize=9)
+    ax_cont.set_yticks([])
+    ax_cont.axvline(x=5.5, color='white', linestyle='-', linewidth=1.5, alpha=0.9)
+    ax_cont.axvline(x=8.5, color='white', linestyle='-', linewidth=1.5, alpha=0.9)
+    ax_cont.set_title("Health Continuum Reference", fontsize=10, pad=8)
+
+    canvas.draw()
+    _backgrounds[categories] = (fig, ax_radar, angles, canvas.copy_from_bbox(fig.bbox))
+    return _backgrounds[categories]
+
+
+def _draw_scores(ax_radar, angles, scores):
+    """Add the per-chart artists and return them so they can be removed again."""
+    avg_score = float(np.mean(scores))
+    scores = scores + scores[:1]
+    artists = []
+
+    artists += ax_radar.plot(angles, scores, 'o-', linewidth=2, color='#333333', alpha=0.7)
+    artists += ax_radar.fill(angles, scores, color=cmap((avg_score - 1)/9.0), alpha=0.25)
+
+    for angle, score in zip(angles[:-1], scores[:-1]):
+        artists += ax_radar.plot(angle, score, 'o', markersize=8, color=cmap((score - 1)/9.0))
+        artists.append(ax_radar.annotate(
+            f"{score:.1f}",
+            xy=(angle, score + 0.3),
+            textcoords="offset points", xytext=(0, 5),
+            ha='center', fontsize=9, fontweight='bold',
+            bbox=dict(boxstyle="round,pad=0.2", fc=cmap((score - 1)/9.0), ec="black", alpha=0.7)
+        ))
+
+    artists.append(ax_radar.annotate(
+        f"Overall: {avg_score:.1f}/10",
+        xy=(0.5, 0.5), xycoords='axes fraction', ha='center',
+        fontsize=12, fontweight='bold',
+        bbox=dict(boxstyle="round,pad=0.3", fc=cmap((avg_score - 1)/9.0), ec="black", alpha=0.8)
+    ))
+    return artists
+
+
+@lru_cache(maxsize=64)
+@metrics.timed("radar.png")
+def _render(scores, categories):
+    metrics.count("radar_renders", renderer="png")
+    with _lock:
+        fig, ax_radar, angles, background = _background(categories)
+        fig.canvas.restore_region(background)
+        artists = _draw_scores(ax_radar, angles, list(scores))
+        try:
+            for artist in artists:
+                ax_radar.draw_artist(artist)
+            pixels = np.array(fig.canvas.buffer_rgba())
+        finally:
+            for artist in artists:
+                artist.remove()
+
+    out = BytesIO()
+    Image.fromarray(pixels).save(out, format="PNG")
+    return out.getvalue()
+
+
+def render_radar(scores, categories):
+    """PNG bytes of the radar chart for the given per-category scores."""
+    # two decimals is well below what the chart can show, and keeps float
+    # noise from defeating the cache
+    metrics.count("radar_requests", renderer="png")
+    return _render(tuple(round(float(s), 2) for s in scores), tuple(categories))
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+Radar chart as an SVG string, without matplotlib.
+
+Same layout as the PNG from radar.py (polar grid, 5.5 and 8.5 threshold
+lines, score polygon coloured on the health scale, continuum bar), computed
+with NumPy and written out as a few kilobytes of SVG. The drawing is done in
+a 1000 x 1100 viewBox, i.e. the PNG's 10 x 11 inch figure at 100 units per
+inch, so sizes given in points below are multiplied by PT.
+"""
+
+from functools import lru_cache
+from html import escape
+
+import numpy as np
+
+from metrics import metrics
+
+colors = [
+    "#ff0000", "#ff4500", "#ff8c00", "#ffaa00", "#ffff00", "#ffff00", "#ffff00",
+    "#aaff00", "#55ff00", "#00ff00", "#008800"
+]
+_stops = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in colors], dtype=float)
+
+WIDTH, HEIGHT = 1000, 1100
+PT = 100 / 72  # viewBox units per point
+CX, CY, RADIUS = 512.5, 478.5, 346.5  # radar axes, where the PNG has them
+BAR_X, BAR_Y, BAR_W, BAR_H = 125, 902, 775, 77  # continuum bar
+GRID = "#b0b0b0"
+FONT = 'font-family="DejaVu Sans,Verdana,sans-serif"'
+
+
+def health_color(score):
+    """Hex colour of a 1–10 score on the health scale (same 256 steps as the PNG's cmap)."""
+    if np.isnan(score):
+        return "#000000"  # the cmap's "bad" colour, drawn at the element's opacity as in the PNG
+    step = min(max(int((score - 1) / 9.0 * 256), 0), 255)
+    rgb = [np.interp(step / 255, np.linspace(0, 1, len(colors)), _stops[:, i]) for i in range(3)]
+    return "#" + "".join(f"{round(v):02x}" for v in rgb)
+
+
+def _point(angle, r):
+    # clockwise from the top, like the PNG's polar axes
+    return CX + RADIUS * r / 10 * np.sin(angle), CY - RADIUS * r / 10 * np.cos(angle)
+
+
+def _polygon(angles, radii):
+    return " ".join("%.1f,%.1f" % _point(a, r) for a, r in zip(angles, radii))
+
+
+def _outline(angles, radii):
+    # closed outline as a path, broken where a score is missing (like a matplotlib line)
+    runs, run = [], []
+    for a, r in zip(list(angles) + [angles[0]], list(radii) + [radii[0]]):
+        if np.isnan(r):
+            runs.append(run)
+            run = []
+        else:
+            run.append("%.1f,%.1f" % _point(a, r))
+    runs.append(run)
+    return " ".join("M" + " L".join(run) for run in runs if len(run) > 1)
+
+
+def _label(x, y, text, size, fill, opacity):
+    # matplotlib sizes its round boxes to the text; approximate bold glyphs as 0.62em
+    width = len(text) * 0.62 * size + size * 0.6
+    height = size * 1.5
+    return (
+        f'<rect x="{x - width / 2:.1f}" y="{y - height / 2:.1f}" width="{width:.1f}" height="{height:.1f}" '
+        f'rx="{size * 0.3:.1f}" fill="{fill}" fill-opacity="{opacity}" stroke="#000" stroke-opacity="{opacity}"/>'
+        f'<text x="{x:.1f}" y="{y:.1f}" font-size="{size:.1f}" font-weight="bold" text-anchor="middle" '
+        f'dominant-baseline="central">{escape(text)}</text>'
+    )
+
+
+@lru_cache(maxsize=64)
+@metrics.timed("radar.svg")
+def _render(scores, categories):
+    metrics.count("radar_renders", renderer="svg")
+    angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False)
+    avg_score = float(np.mean(scores))
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {WIDTH} {HEIGHT}" {FONT}>',
+        f'<rect width="{WIDTH}" height="{HEIGHT}" fill="#fff"/>',
+        # matplotlib pads the title 20pt above the top category label, not the axes
+        f'<text x="{CX}" y="{CY - RADIUS - 20 * PT - 26:.1f}" font-size="{15 * PT:.1f}" font-weight="bold" '
+        f'text-anchor="middle">Church Health Assessment</text>',
+    ]
+
+    # grid, tick labels and category labels
+    for r in (1, 3, 5, 7, 9):
+        out.append(f'<circle cx="{CX}" cy="{CY}" r="{RADIUS * r / 10:.1f}" fill="none" stroke="{GRID}" stroke-width="1.1"/>')
+    for angle, name in zip(angles, categories):
+        x, y = _point(angle, 10)
+        out.append(f'<line x1="{CX}" y1="{CY}" x2="{x:.1f}" y2="{y:.1f}" stroke="{GRID}" stroke-width="1.1"/>')
+        x, y = _point(angle, 10.65)
+        anchor = "middle" if abs(np.sin(angle)) < 0.1 else ("start" if np.sin(angle) > 0 else "end")
+        out.append(f'<text x="{x:.1f}" y="{y:.1f}" font-size="{11 * PT:.1f}" text-anchor="{anchor}" '
+                   f'dominant-baseline="central">{escape(name)}</text>')
+    out.append(f'<circle cx="{CX}" cy="{CY}" r="{RADIUS}" fill="none" stroke="#000" stroke-width="1.1"/>')
+    for r in (1, 3, 5, 7, 9):
+        out.append(f'<text x="{CX}" y="{CY - RADIUS * r / 10:.1f}" font-size="{9 * PT:.1f}" fill="grey" '
+                   f'text-anchor="middle" dominant-baseline="central">{r}</text>')
+
+    # threshold lines
+    for r, color in ((5.5, "#ffaa00"), (8.5, "#00aa00")):
+        out.append(f'<polygon points="{_polygon(angles, [r] * len(angles))}" fill="none" stroke="{color}" '
+                   f'stroke-opacity="0.7" stroke-width="{1.5 * PT:.1f}" stroke-dasharray="7.7 3.3"/>')
+
+    # scores
+    # a missing score is filled through the centre, as matplotlib does, but gets no point or label
+    out.append(f'<polygon points="{_polygon(angles, np.nan_to_num(scores))}" fill="{health_color(avg_score)}" '
+               f'fill-opacity="0.25"/>')
+    out.append(f'<path d="{_outline(angles, scores)}" fill="none" stroke="#333" stroke-opacity="0.7" '
+               f'stroke-width="{2 * PT:.1f}" stroke-linejoin="round"/>')
+    scored = [(angle, score) for angle, score in zip(angles, scores) if not np.isnan(score)]
+    for angle, score in scored:
+        x, y = _point(angle, score)
+        out.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{3 * PT:.1f}" fill="#333" fill-opacity="0.7"/>')
+        out.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{4 * PT:.1f}" fill="{health_color(score)}"/>')
+    for angle, score in scored:
+        x, y = _point(angle, score + 0.3)
+        out.append(_label(x, y - 5 * PT - 9 * PT * 0.75, f"{score:.1f}", 9 * PT, health_color(score), 0.7))
+    out.append(_label(CX, CY, f"Overall: {avg_score:.1f}/10", 12 * PT, health_color(avg_score), 0.8))
+
+    # continuum bar
+    stops = "".join(
+        f'<stop offset="{i / (len(colors) - 1):.3f}" stop-color="{c}"/>' for i, c in enumerate(colors)
+    )
+    out.append(f'<defs><linearGradient id="health">{stops}</linearGradient></defs>')
+    out.append(f'<text x="{BAR_X + BAR_W / 2}" y="{BAR_Y - 8 * PT:.1f}" font-size="{10 * PT:.1f}" '
+               f'text-anchor="middle">Health Continuum Reference</text>')
+    out.append(f'<rect x="{BAR_X}" y="{BAR_Y}" width="{BAR_W}" height="{BAR_H}" fill="url(#health)" '
+               f'stroke="#000" stroke-width="1.1"/>')
+    for value in (1, 5.5, 8.5, 10):
+        x = BAR_X + BAR_W * (value - 1) / 9
+        if value in (5.5, 8.5):
+            out.append(f'<line x1="{x:.1f}" y1="{BAR_Y}" x2="{x:.1f}" y2="{BAR_Y + BAR_H}" stroke="#fff" '
+                       f'stroke-opacity="0.9" stroke-width="{1.5 * PT:.1f}"/>')
+        out.append(f'<line x1="{x:.1f}" y1="{BAR_Y + BAR_H}" x2="{x:.1f}" y2="{BAR_Y + BAR_H + 5}" stroke="#000"/>')
+        out.append(f'<text x="{x:.1f}" y="{BAR_Y + BAR_H + 8 + 9 * PT:.1f}" font-size="{9 * PT:.1f}" '
+                   f'text-anchor="middle">{value:g}</text>')
+
+    out.append("</svg>")
+    return "".join(out)
+
+
+def render_radar_svg(scores, categories):
+    """SVG markup of the radar chart for the given per-category scores."""
+    metrics.count("radar_requests", renderer="svg")
+    return _render(tuple(round(float(s), 2) for s in scores), tuple(categories))
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+Results for every church code at once, without the web app.
+
+    python report.py reports/                         # store set up as in .streamlit/secrets.toml
+    python report.py reports/ --from 2025-01-01 --to 2025-06-30
+    python report.py reports/ --control-ids official.csv --min-respondents 5
+    python report.py reports/ --snapshot responses_snapshot.npz
+
+The responses are read once, from the store the app is configured with or
+from a table snapshot the app saved, and grouped by Code in one pass over
+the table's columns. Every church gets the radar PNG and the health status
+its results page shows: reports/radar/<code>.png, plus one row in
+reports/report.xlsx. Charts are drawn by a pool of worker processes, each
+keeping its own matplotlib background; the workbook is written with
+openpyxl's write-only (streaming) mode, so it never sits in memory whole.
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+
+from aggregates import QUESTIONS
+from checklist import classify, main_virtues
+from responses import ResponseTable
+
+
+def open_table(args, workdir):
+    """The response table, loaded once from a snapshot or the configured store."""
+    if args.snapshot:
+        table = ResponseTable()
+        table.load(args.snapshot)
+        return table
+    from storage import SheetsStore, SQLiteStore
+    with open(args.secrets, "rb") as f:
+        secrets = tomllib.load(f)
+    config = secrets["app"]
+    if config.get("store", "sheets") == "sqlite":
+        path = config.get("sqlite_path", "responses.db")
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)  # SQLiteStore would create an empty one
+        store = SQLiteStore(path)
+    else:
+        from sheets import SheetPool
+        pool = SheetPool(
+            secrets["gcp_service_account"], config["sheet_url"],
+            requests_per_minute=config.get("sheets_requests_per_minute", 60)
+        )
+        # a spool of our own: this process only reads, and must not send the app's pending rows
+        store = SheetsStore(pool, os.path.join(workdir, "spool.db"))
+    return store.refresh(max_age=0, wait=True)
+
+
+def summaries(stats_by_code, min_respondents=1):
+    """(code, respondents, Q1–Q7 means, average, status, interpretation) per church, by code."""
+    rows = []
+    for code in sorted(stats_by_code, key=lambda c: (c.casefold(), c)):
+        stats = stats_by_code[code]
+        if not code or stats.n < min_respondents:
+            continue
+        avg_scores = stats.means().tolist()
+        average = float(np.mean(avg_scores))  # as on the results page
+        classification, interpretation = classify(average)
+        rows.append((code, stats.n, avg_scores, average, classification, interpretation))
+    return rows
+
+
+def file_names(codes):
+    """A distinct, file-system safe PNG name per code (case-insensitively distinct too)."""
+    names, taken = {}, set()
+    for code in codes:
+        base = re.sub(r"[^\w.-]+", "_", code).strip("._") or "code"
+        name, i = base, 1
+        while name.casefold() in taken:
+            i += 1
+            name = f"{base}-{i}"
+        taken.add(name.casefold())
+        names[code] = f"{name}.png"
+    return names
+
+
+def _draw(job):
+    from radar import render_radar  # imported in the worker, which keeps its own figures
+    path, scores, categories = job
+    with open(path, "wb") as f:
+        f.write(render_radar(scores, categories))
+    return path
+
+
+def draw_all(jobs, workers):
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            _draw(job)
+        return
+    # spawned rather than forked: the store's background threads may hold locks
+    context = multiprocessing.get_context("spawn")
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        for _ in pool.map(_draw, jobs, chunksize=chunksize):
+            pass
+
+
+def write_workbook(path, rows, charts, settings, unmatched=None):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    workbook = Workbook(write_only=True)
+
+    def heading(sheet, names):
+        cells = []
+        for name in names:
+            cell = WriteOnlyCell(sheet, value=name)
+            cell.font = Font(bold=True)
+            cells.append(cell)
+        sheet.append(cells)
+
+    summary = workbook.create_sheet("Summary")
+    summary.freeze_panes = "A2"
+    heading(summary, ["Code", "Respondents"] + [f"{q} {name}" for q, name in zip(QUESTIONS, main_virtues)]
+            + ["Average", "Health Status", "Interpretation", "Radar Chart"])
+    for code, n, avg_scores, average, classification, interpretation in rows:
+        summary.append([code, n] + [_cell(s) for s in avg_scores]
+                       + [_cell(average), classification, interpretation, charts[code]])
+
+    about = workbook.create_sheet("Settings")
+    for name, value in settings:
+        about.append([name, value])
+
+    if unmatched is not None:
+        missing = workbook.create_sheet("Unmatched Control IDs")
+        heading(missing, ["Code", "Control_ID"])
+        for pair in unmatched:
+            missing.append(list(pair))
+
+    workbook.save(path)
+
+
+def _cell(value):
+    # Excel has no NaN; a question nobody scored is left blank
+    return None if np.isnan(value) else round(value, 4)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("out", help="folder for report.xlsx and the radar/ charts (created if needed)")
+    parser.add_argument("--secrets", default=os.path.join(".streamlit", "secrets.toml"),
+                        help="the app's secrets file, for the store and its credentials")
+    parser.add_argument("--snapshot", help="read a table snapshot saved by the app instead of the store")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="first day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="last day (YYYY-MM-DD)")
+    parser.add_argument("--control-ids", help="CSV/Excel file with Code and Control_ID columns; only those respondents count")
+    parser.add_argument("--min-respondents", type=int, default=1, help="leave out churches with fewer responses")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes drawing charts")
+    args = parser.parse_args(argv)
+
+    pairs = None
+    if args.control_ids:
+        from uploads import UploadError, control_id_pairs
+        try:
+            with open(args.control_ids, "rb") as f:
+                pairs = control_id_pairs(f)
+        except (OSError, UploadError) as e:
+            parser.error(f"--control-ids: {e}")
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            table = open_table(args, workdir)
+        except (OSError, KeyError, ValueError) as e:
+            parser.error(f"could not load the responses: {e!r}")
+        rows = summaries(table.stats_by_code(args.start, args.end, pairs), args.min_respondents)
+        unmatched = table.match_control_ids(pairs)[2] if pairs is not None else None
+    print(f"{len(table):,} responses read, {len(rows):,} churches to report "
+          f"({time.perf_counter() - started:.1f} s)", flush=True)
+
+    chart_dir = os.path.join(args.out, "radar")
+    os.makedirs(chart_dir, exist_ok=True)
+    names = file_names(code for code, *_ in rows)
+    charts = {code: os.path.join("radar", name) for code, name in names.items()}
+    jobs = [(os.path.join(args.out, charts[code]), avg_scores, main_virtues) for code, _, avg_scores, *_ in rows]
+    started = time.perf_counter()
+    draw_all(jobs, args.workers)
+    print(f"{len(jobs):,} radar charts drawn in {chart_dir} ({time.perf_counter() - started:.1f} s)", flush=True)
+
+    settings = [
+        ("Generated", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        ("Source", args.snapshot or args.secrets),
+        ("From", args.start.isoformat() if args.start else "(first response)"),
+        ("To", args.end.isoformat() if args.end else "(last response)"),
+        ("Control IDs", f"{args.control_ids} ({len(pairs):,} ids)" if pairs is not None else "(all respondents)"),
+        ("Minimum respondents", args.min_respondents),
+        ("Churches", len(rows)),
+        ("Respondents", sum(n for _, n, *_ in rows)),
+    ]
+    path = os.path.join(args.out, "report.xlsx")
+    write_workbook(path, rows, charts, settings, unmatched)
+    print(f"Summary written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
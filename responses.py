@@ -0,0 +1,650 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+In-process copy of the stored responses, kept up to date incrementally.
+
+Responses are only ever appended, so the table only ever grows; the store
+behind it (see storage.py) decides how new rows are fetched and when the
+whole table has to be reloaded.
+
+Rows are indexed by church code and by (Code, Control_ID) as they are
+ingested, so per-church lookups don't scan every other church's responses,
+and running Q1–Q7 aggregates are kept per code for the results page, both
+overall and per day for the date-range filter, along with a histogram of the
+1–10 scores per question. Timestamps are parsed once, when a row is
+ingested.
+
+Submissions made in this process are merged in right away as "local" rows,
+until the same row shows up in the store. Each church code carries a version
+number that changes whenever its rows do, so caches built on top of the table
+can be keyed per church instead of being cleared wholesale.
+
+Rows are held column-wise rather than as dicts: Q1–Q7 in one int8 matrix,
+timestamps as int64 epoch seconds, and codes and Control IDs as int32 ids
+into lookup tables of their distinct values. The rare row that doesn't fit
+those columns exactly (odd timestamp format, extra columns, non-integer
+score) is kept verbatim on the side, so records() still returns what the
+store holds. Scores outside the int8 columns don't count in aggregates.
+New rows are parsed a block at a time, column by column; only rows with a
+cell in some other form than the columns hold are converted one by one.
+
+Only one thread syncs at a time. Others arriving meanwhile get the rows
+already held instead of starting their own fetch (or wait for it, if the
+table is still empty), so an expiring table costs one fetch, not one per
+session.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import repeat
+
+import numpy as np
+from gspread.utils import numericise, numericise_all
+
+from aggregates import QUESTIONS, DailyStats, ScoreHistogram, ScoreStats, parse_day, parse_timestamp
+
+# Column layout written by append_response()
+HEADER = ["Timestamp", "Code", "Control_ID"] + QUESTIONS
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+NO_TIME = np.iinfo(np.int64).min  # timestamp that couldn't be parsed
+NO_SCORE = 0  # blank or unusable score
+SNAPSHOT_FORMAT = 1
+
+# cell texts the columns reproduce exactly, so ingesting them needs no check
+_TIME_TEXT = re.compile(r"[1-9]\d{3}-\d\d-\d\d \d\d:\d\d:\d\d")
+_SCORE_TEXT = {"": NO_SCORE, **{str(score): score for score in range(1, 128)}}
+_NUMBER_START = re.compile(r"[\s,]*[-+]?[\s,]*[\d.nNiI]")  # what int()/float() might accept
+
+
+class _Interned:
+    """Distinct values, each referred to by a small integer id."""
+
+    def __init__(self):
+        self.values = []
+        self._ids = {}
+
+    def id(self, value):
+        key = (type(value), value)  # keep 1 and "1" apart
+        if key not in self._ids:
+            self._ids[key] = len(self.values)
+            self.values.append(value)
+        return self._ids[key]
+
+    def nbytes(self):
+        return (sys.getsizeof(self.values) + sys.getsizeof(self._ids)
+                + sum(sys.getsizeof(v) for v in self.values))
+
+
+def _key(value):
+    return str(value).strip()
+
+
+def pair_key(code, control_id):
+    """(Code, Control_ID) as the table keys it: numericised like the sheet, then stripped.
+
+    So an uploaded "001" finds the 1 that get_all_records() made of it.
+    """
+    return tuple(_key(numericise(_key(v), empty2zero=False, default_blank="")) for v in (code, control_id))
+
+
+def numericise_row(row, width):
+    # same conversion get_all_records() applies, padded to the header width
+    row = list(row) + [""] * (width - len(row))
+    return numericise_all(row[:width], empty2zero=False, default_blank="")
+
+
+class ResponseTable:
+    """Append-only table of stored rows (as get_all_records() dicts)."""
+
+    def __init__(self):
+        self._lock = threading.RLock()  # guards the data
+        self._sync_lock = threading.Lock()  # one sync at a time
+        self.header = []
+        self._clear()
+        self._local = []  # records submitted here, not yet seen in the sheet
+        self._stats = {}  # code -> ScoreStats over sheet and local rows
+        self._daily = {}  # code -> DailyStats, same rows
+        self._hists = {}  # code -> ScoreHistogram, same rows
+        self._versions = {}  # code -> data version
+        self.version = 0
+        self.synced_at = 0.0
+
+    def __len__(self):
+        return self._n
+
+    def _clear(self):
+        self._n = 0
+        self._scores = np.zeros((0, len(QUESTIONS)), dtype=np.int8)
+        self._times = np.zeros(0, dtype=np.int64)
+        self._code_ids = np.zeros(0, dtype=np.int32)
+        self._control_id_ids = np.zeros(0, dtype=np.int32)
+        self._codes = _Interned()
+        self._control_id_values = _Interned()
+        self._odd = {}  # position -> record that the columns can't reproduce
+        self._last_row = None  # raw values of the last ingested row
+        self._by_code = {}  # code -> positions (array of int32)
+        self._control_ids = {}  # (code, control_id) -> positions (array of int32)
+
+    def memory_usage(self):
+        """Approximate bytes held per part of the table, plus a total."""
+        with self._lock:
+            usage = {
+                "scores": self._scores.nbytes,
+                "timestamps": self._times.nbytes,
+                "codes": self._code_ids.nbytes + self._codes.nbytes(),
+                "control_ids": self._control_id_ids.nbytes + self._control_id_values.nbytes(),
+                "indexes": sum(sys.getsizeof(a) for a in self._by_code.values())
+                           + sum(sys.getsizeof(a) + sys.getsizeof(k) for k, a in self._control_ids.items())
+                           + sys.getsizeof(self._by_code) + sys.getsizeof(self._control_ids),
+                "odd_rows": sum(sys.getsizeof(r) for r in self._odd.values()),
+                "histograms": sum(h.counts.nbytes for h in self._hists.values()),
+            }
+        usage["total"] = sum(usage.values())
+        return usage
+
+    def expire(self):
+        """Force the next refresh() to sync, e.g. after a submission."""
+        self.synced_at = 0.0
+
+    @property
+    def last_row(self):
+        """Raw values of the last ingested row (None if there is none)."""
+        return self._last_row
+
+    def refresh(self, sync, max_age=15, wait=False):
+        """Call sync(table) unless the last sync is under max_age seconds old.
+
+        If another thread is already syncing, return at once with the current
+        rows, unless wait is set or there are no rows yet.
+        """
+        if time.monotonic() - self.synced_at < max_age:
+            return
+        if not self._sync_lock.acquire(blocking=wait or not self.header):
+            return
+        try:
+            if time.monotonic() - self.synced_at < max_age:
+                return  # someone else synced while we waited
+            sync(self)
+            self.synced_at = time.monotonic()
+        finally:
+            self._sync_lock.release()
+
+    def add_local(self, row):
+        """Merge a row we just submitted, without waiting for the next sync."""
+        with self._lock:
+            record = self._to_record(row)
+            self._local.append(record)
+            self._add_stats(record)
+            self._bump(_key(record["Code"]))
+
+    def code_version(self, code):
+        with self._lock:
+            return self._versions.get(code.strip(), 0)
+
+    def records(self):
+        with self._lock:
+            return [self._record(i) for i in range(self._n)] + self._local
+
+    def code_records(self, code):
+        """Records for one church code (compared stripped, like the sheet values)."""
+        code = code.strip()
+        with self._lock:
+            rows = [self._record(i) for i in self._by_code.get(code, ())]
+            return rows + [r for r in self._local if _key(r["Code"]) == code]
+
+    def code_stats(self, code):
+        """Snapshot of the running Q1–Q7 aggregates for one church code."""
+        with self._lock:
+            stats = self._stats.get(code.strip())
+            return stats.copy() if stats else ScoreStats()
+
+    def code_histogram(self, code):
+        """Snapshot of one church code's 1–10 score counts per question."""
+        with self._lock:
+            hist = self._hists.get(code.strip())
+            return hist.copy() if hist else ScoreHistogram()
+
+    def code_stats_between(self, code, start, end):
+        """Aggregates for one church code over the dates start..end (inclusive)."""
+        with self._lock:
+            daily = self._daily.get(code.strip())
+            return daily.between(start, end) if daily else ScoreStats()
+
+    def code_trend(self, code, unit="month"):
+        """[(first day, ScoreStats)] for each month (or week) with responses from one church code."""
+        with self._lock:
+            daily = self._daily.get(code.strip())
+            return daily.periods(unit) if daily else []
+
+    def has_control_id(self, code, control_id):
+        pair = pair_key(code, control_id)  # "001" is the 1 the sheet made of it
+        with self._lock:
+            return pair in self._control_ids or any(
+                pair_key(r["Code"], r["Control_ID"]) == pair for r in self._local
+            )
+
+    def match_control_ids(self, pairs):
+        """Aggregate the responses for a set of (code, control_id) pairs.
+
+        Returns (ScoreStats, respondents per code, pairs with no response).
+        Each pair is probed in the (Code, Control_ID) index; nothing is copied.
+        """
+        stats = ScoreStats()
+        code_counts = Counter()
+        unmatched = []
+        positions = array("i")
+        with self._lock:
+            local = {}
+            for record in self._local:
+                local.setdefault((_key(record["Code"]), _key(record["Control_ID"])), []).append(record)
+            for pair in dict.fromkeys(pair_key(c, i) for c, i in pairs):
+                found = self._control_ids.get(pair, ())
+                for pos in found:
+                    if pos in self._odd:
+                        stats.add_record(self._odd[pos])
+                        code_counts[pair[0]] += 1
+                    else:
+                        positions.append(pos)
+                for record in local.get(pair, ()):
+                    stats.add_record(record)
+                    code_counts[pair[0]] += 1
+                if not found and pair not in local:
+                    unmatched.append(pair)
+            rows = np.array(positions, dtype=np.int64)
+            stats.add_values(_as_float(self._scores[rows]))
+            per_code = np.bincount(self._code_ids[rows])
+            for code_id in np.flatnonzero(per_code):
+                code_counts[_key(self._codes.values[code_id])] += int(per_code[code_id])
+        return stats, code_counts, unmatched
+
+    def stats_by_code(self, start=None, end=None, pairs=None):
+        """Aggregates for every church code at once: {code: ScoreStats}.
+
+        Optionally only responses dated start..end (dates, inclusive; either
+        may be None) and only those whose (Code, Control_ID) is in pairs.
+        The columns are filtered and grouped by code id in one pass.
+        """
+        window = start is not None or end is not None
+        first = start.toordinal() if start else -np.inf
+        last = end.toordinal() if end else np.inf
+        wanted = None if pairs is None else set(pair_key(c, i) for c, i in pairs)
+
+        def keep(record):
+            if wanted is not None and (_key(record.get("Code", "")), _key(record.get("Control_ID", ""))) not in wanted:
+                return False
+            if window:
+                day = parse_day(record.get("Timestamp", ""))
+                return day is not None and first <= day <= last
+            return True
+
+        result = {}
+        with self._lock:
+            selected = np.ones(self._n, dtype=bool)
+            selected[list(self._odd)] = False
+            if wanted is not None:
+                matched = np.zeros(self._n, dtype=bool)
+                for pair in wanted:
+                    matched[np.frombuffer(self._control_ids.get(pair, array("i")), dtype=np.int32)] = True
+                selected &= matched
+            if window:
+                times = self._times[:self._n]
+                days = EPOCH.toordinal() + times // 86400
+                selected &= (times != NO_TIME) & (days >= first) & (days <= last)
+            rows = np.flatnonzero(selected)
+            code_ids, inverse = np.unique(self._code_ids[rows], return_inverse=True)
+            values = _as_float(self._scores[rows])
+            valid = ~np.isnan(values)
+            values[~valid] = 0.0
+            n = np.bincount(inverse, minlength=len(code_ids))
+            count, total, total_sq = (np.zeros((len(code_ids), len(QUESTIONS))) for _ in range(3))
+            np.add.at(count, inverse, valid)
+            np.add.at(total, inverse, values)
+            np.add.at(total_sq, inverse, values * values)
+            for i, code_id in enumerate(code_ids.tolist()):
+                stats = ScoreStats()
+                stats.n, stats.count, stats.total, stats.total_sq = int(n[i]), count[i], total[i], total_sq[i]
+                code = _key(self._codes.values[code_id])
+                result.setdefault(code, ScoreStats()).merge(stats)
+            for record in list(self._odd.values()) + self._local:
+                if keep(record):
+                    result.setdefault(_key(record.get("Code", "")), ScoreStats()).add_record(record)
+        return result
+
+    def rows_landed(self, rows, since):
+        """For each raw row, whether an identical row was ingested at position >= since."""
+        with self._lock:
+            width = len(self.header)
+            seen = Counter(tuple(self._record(i).values()) for i in range(since, self._n))
+            landed = []
+            for row in rows:
+                key = tuple(numericise_row([str(v) for v in row], width))
+                landed.append(seen[key] > 0)
+                seen[key] -= 1
+            return landed
+
+    def reset(self, header, rows=()):
+        """Replace everything ingested so far (local submissions are kept)."""
+        with self._lock:
+            self.header = list(header)
+            self._clear()
+            self._stats = {}
+            self._daily = {}
+            self._hists = {}
+            for record in self._local:
+                self._add_stats(record)
+            self._versions = {code: v + 1 for code, v in self._versions.items()}
+            self.version += 1
+            self._ingest(rows)
+
+    def ingest(self, rows):
+        """Append raw rows that follow the last ingested one."""
+        with self._lock:
+            self._ingest(rows)
+
+    def dump(self, f, watermark=None):
+        """Write the ingested rows as an .npz snapshot to a binary file (local submissions are left out).
+
+        watermark is stored alongside for the caller, e.g. the last database id read.
+        """
+        with self._lock:
+            n = self._n
+            # columns are only ever appended to (or replaced), so views stay valid
+            columns = {
+                "scores": self._scores[:n], "times": self._times[:n],
+                "code_ids": self._code_ids[:n], "control_id_ids": self._control_id_ids[:n],
+            }
+            meta = {
+                "format": SNAPSHOT_FORMAT, "watermark": watermark, "header": self.header,
+                "last_row": None if self._last_row is None else list(self._last_row),
+                "codes": list(self._codes.values), "control_ids": list(self._control_id_values.values),
+                "odd": [[pos, record] for pos, record in self._odd.items()],
+            }
+        np.savez(f, meta=np.array(json.dumps(meta)), **columns)
+
+    def save(self, path, watermark=None):
+        """dump() to a file path, replacing any earlier snapshot there at once."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            self.dump(f, watermark)
+        os.replace(tmp, path)  # readers never see a half-written snapshot
+
+    def load(self, path):
+        """Replace the ingested rows with a snapshot from save() or dump(); returns its watermark.
+
+        path may also be an open binary file.
+        """
+        with np.load(path, allow_pickle=False) as snapshot:
+            meta = json.loads(str(snapshot["meta"]))
+            if meta["format"] != SNAPSHOT_FORMAT:
+                raise ValueError(f"unsupported snapshot format {meta['format']}")
+            columns = {name: snapshot[name] for name in ("scores", "times", "code_ids", "control_id_ids")}
+        codes, control_ids = _Interned(), _Interned()
+        for value in meta["codes"]:
+            codes.id(value)
+        for value in meta["control_ids"]:
+            control_ids.id(value)
+        n = len(columns["times"])
+        odd = {pos: record for pos, record in meta["odd"]}
+        by_code = _group(columns["code_ids"], lambda i: _key(codes.values[i]))
+        pair_ids = columns["code_ids"].astype(np.int64) * len(control_ids.values) + columns["control_id_ids"]
+        by_pair = _group(pair_ids, lambda i: (
+            _key(codes.values[i // len(control_ids.values)]), _key(control_ids.values[i % len(control_ids.values)])
+        ))
+        by_pair = {pair: positions for pair, positions in by_pair.items() if pair[1]}
+
+        with self._lock:
+            before, header = self._code_states(), self.header
+            self.header = meta["header"]
+            self._clear()
+            self._n = n
+            self._scores, self._times = columns["scores"], columns["times"]
+            self._code_ids, self._control_id_ids = columns["code_ids"], columns["control_id_ids"]
+            self._codes, self._control_id_values = codes, control_ids
+            self._odd = odd
+            self._last_row = meta["last_row"]
+            self._by_code, self._control_ids = by_code, by_pair
+            self._stats = {}
+            self._daily = {}
+            self._hists = {}
+            self._drop_landed_local()
+            self._add_rows_stats(np.arange(n))
+            for record in self._local:
+                self._add_stats(record)
+            after = self._code_states()
+            for code in set(before) | set(after):
+                if self.header != header or before.get(code) != after.get(code):
+                    self._bump(code)  # caches of churches the snapshot left as they were stay valid
+        return meta["watermark"]
+
+    def _to_record(self, raw):
+        header = self.header or HEADER
+        return dict(zip(header, numericise_row([str(v) for v in raw], len(header))))
+
+    def _add_stats(self, record):
+        code = _key(record.get("Code", ""))
+        self._stats.setdefault(code, ScoreStats()).add_record(record)
+        self._hists.setdefault(code, ScoreHistogram()).add_record(record)
+        day = parse_day(record.get("Timestamp", ""))
+        if day is not None:
+            self._daily.setdefault(code, DailyStats()).add_record(day, record)
+
+    def _drop_landed_local(self):
+        """Forget local records that the ingested rows already hold (one row each)."""
+        taken = set()
+        for record in list(self._local):
+            for pos in reversed(self._by_code.get(_key(record.get("Code", "")), ())):
+                if pos not in taken and self._record(pos) == record:
+                    taken.add(pos)
+                    self._local.remove(record)  # our own submission has reached the sheet
+                    break
+
+    def _code_states(self):
+        """What each code's version stands for: its rows (positions and cells) and aggregates."""
+        odd = {}
+        for pos, record in self._odd.items():
+            odd.setdefault(_key(record.get("Code", "")), []).append((pos, record))
+        states = {}
+        for code in set(self._by_code) | set(self._stats):
+            rows = np.array(self._by_code.get(code, ()), dtype=np.int64)
+            stats, hist = self._stats.get(code, ScoreStats()), self._hists.get(code, ScoreHistogram())
+            states[code] = (
+                rows.tobytes(), self._times[rows].tobytes(), self._scores[rows].tobytes(),
+                [self._codes.values[i] for i in self._code_ids[rows].tolist()],
+                [self._control_id_values.values[i] for i in self._control_id_ids[rows].tolist()],
+                odd.get(code, []), stats.n, stats.count.tobytes(), stats.total.tobytes(),
+                stats.total_sq.tobytes(), hist.counts.tobytes(),
+            )
+        return states
+
+    def _bump(self, code):
+        self._versions[code] = self._versions.get(code, 0) + 1
+        self.version += 1
+
+    def _ingest(self, rows):
+        if not rows:
+            return
+        start, stop = self._n, self._n + len(rows)
+        if stop > len(self._times):
+            self._grow(max(1024, 2 * stop))
+        exact = self._store_block(rows, start)
+        for i in np.flatnonzero(~exact).tolist():
+            self._store(self._to_record(rows[i]), start + i)
+        self._n = stop
+        self._last_row = rows[-1]
+
+        local_codes = {_key(r.get("Code", "")) for r in self._local}
+        keys = {}  # code id -> code, for this block
+        fresh = array("i")  # positions whose scores aren't in the aggregates yet
+        changed = set()
+        rows_at = zip(range(start, stop), self._code_ids[start:stop].tolist(),
+                      self._control_id_ids[start:stop].tolist())
+        for pos, code_id, control_id_id in rows_at:
+            code = keys.get(code_id)
+            if code is None:
+                code = keys[code_id] = _key(self._codes.values[code_id])
+            control_id = _key(self._control_id_values.values[control_id_id])
+            self._by_code.setdefault(code, array("i")).append(pos)
+            if control_id:
+                self._control_ids.setdefault((code, control_id), array("i")).append(pos)
+            if code in local_codes:
+                record = self._record(pos)
+                if record in self._local:
+                    self._local.remove(record)  # our own submission has reached the sheet
+                    continue
+            fresh.append(pos)
+            changed.add(code)
+        for code in changed:
+            self._bump(code)
+        self._add_rows_stats(np.array(fresh, dtype=np.int64))
+
+    def _store_block(self, rows, start):
+        """Write raw rows into the columns from start on, a column at a time.
+
+        Returns a mask of the rows whose cells all had the plain form the
+        columns reproduce (canonical timestamp, 1–127 or blank scores, no
+        values in extra columns); the others still go through _store().
+        """
+        header = self.header or HEADER
+        width = len(header)
+        column = {name: i for i, name in enumerate(header)}  # last one wins, as in _to_record()
+        if any(len(row) != width for row in rows):
+            rows = [list(row[:width]) + [""] * (width - len(row)) for row in rows]
+        cells = list(zip(*rows))
+        n = len(rows)
+
+        def field(name):
+            i = column.get(name)
+            return [""] * n if i is None else list(map(str, cells[i]))
+
+        exact = np.ones(n, dtype=bool)
+        for i, name in enumerate(header):
+            if column[name] == i and name not in HEADER:
+                exact &= np.array([v == "" for v in cells[i]], dtype=bool)
+
+        texts = field("Timestamp")
+        plain = np.array([not t or _TIME_TEXT.fullmatch(t) is not None for t in texts], dtype=bool)
+        texts = np.array([t if ok else "" for t, ok in zip(texts, plain.tolist())])
+        try:
+            times = texts.astype("datetime64[s]")
+        except ValueError:  # a date that doesn't exist, like February 30
+            times = np.array([_datetime64(t) for t in texts.tolist()], dtype="datetime64[s]")
+        shown = np.datetime_as_string(times, unit="s")
+        plain &= (np.char.replace(shown, "T", " ") == texts) | (texts == "")
+        exact &= plain
+
+        ids = {}
+        for name, interned, out in (("Code", self._codes, self._code_ids),
+                                    ("Control_ID", self._control_id_values, self._control_id_ids)):
+            values = field(name)
+            for text in dict.fromkeys(values):
+                value = _numericised(text)
+                ids[text] = interned.id(value) if value == value else -1  # NaN never equals itself
+            column_ids = np.array([ids[v] for v in values], dtype=np.int32)
+            exact &= column_ids >= 0
+            out[start:start + n] = column_ids
+            ids.clear()
+
+        scores = np.array([list(map(_SCORE_TEXT.get, field(q), repeat(-1))) for q in QUESTIONS], dtype=np.int16).T
+        exact &= (scores >= 0).all(axis=1)
+        self._scores[start:start + n] = np.clip(scores, NO_SCORE, None)
+        self._times[start:start + n] = times.astype(np.int64)  # NaT is NO_TIME
+        return exact
+
+    def _store(self, record, pos):
+        """Write a record into the columns at a position (kept verbatim if they can't reproduce it)."""
+        parsed = parse_timestamp(record.get("Timestamp", ""))
+        self._times[pos] = NO_TIME if parsed is None else (parsed - EPOCH) // timedelta(seconds=1)
+        self._code_ids[pos] = self._codes.id(record.get("Code", ""))
+        self._control_id_ids[pos] = self._control_id_values.id(record.get("Control_ID", ""))
+        self._scores[pos] = [_compact_score(record.get(q, "")) for q in QUESTIONS]
+        if self._record(pos) != record:
+            self._odd[pos] = record
+
+    def _grow(self, capacity):
+        def grown(column):
+            bigger = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+            bigger[:len(column)] = column
+            return bigger
+        self._scores = grown(self._scores)
+        self._times = grown(self._times)
+        self._code_ids = grown(self._code_ids)
+        self._control_id_ids = grown(self._control_id_ids)
+
+    def _record(self, pos):
+        """The record at a position, as get_all_records() would return it."""
+        if pos in self._odd:
+            return self._odd[pos]
+        seconds = int(self._times[pos])
+        values = {
+            "Timestamp": "" if seconds == NO_TIME else (EPOCH + timedelta(seconds=seconds)).strftime(TIME_FORMAT),
+            "Code": self._codes.values[self._code_ids[pos]],
+            "Control_ID": self._control_id_values.values[self._control_id_ids[pos]],
+        }
+        for q, score in zip(QUESTIONS, self._scores[pos].tolist()):
+            values[q] = "" if score == NO_SCORE else score
+        return {name: values.get(name, "") for name in self.header or HEADER}
+
+    def _add_rows_stats(self, rows):
+        """Add the rows at these positions to the aggregates, a block per code."""
+        odd = np.isin(rows, np.fromiter(self._odd, dtype=np.int64, count=len(self._odd)))
+        for pos in rows[odd].tolist():
+            self._add_stats(self._odd[pos])
+        rows = rows[~odd]
+        order = np.argsort(self._code_ids[rows], kind="stable")
+        code_ids, starts = np.unique(self._code_ids[rows][order], return_index=True)
+        for code_id, chunk in zip(code_ids.tolist(), np.split(rows[order], starts[1:])):
+            code = _key(self._codes.values[code_id])
+            scores = _as_float(self._scores[chunk])
+            self._stats.setdefault(code, ScoreStats()).add_values(scores)
+            self._hists.setdefault(code, ScoreHistogram()).add_values(scores)
+            times = self._times[chunk]
+            dated = times != NO_TIME
+            if dated.any():
+                days = EPOCH.toordinal() + times[dated] // 86400
+                self._daily.setdefault(code, DailyStats()).add_values(days, scores[dated])
+
+def _group(ids, key):
+    """Positions of each id, merged under key(id), as sorted int32 arrays."""
+    order = np.argsort(ids, kind="stable")
+    unique, starts = np.unique(ids[order], return_index=True)
+    groups = {}
+    for i, chunk in zip(unique.tolist(), np.split(order, starts[1:])):
+        groups.setdefault(key(i), []).append(chunk)
+    return {k: array("i", np.sort(np.concatenate(chunks)).astype(np.int32).tobytes()) for k, chunks in groups.items()}
+
+
+def _numericised(text):
+    # numericise() leaves most codes and Control IDs alone; don't make it try
+    if _NUMBER_START.match(text) is None:
+        return text
+    return numericise(text, empty2zero=False, default_blank="")
+
+
+def _datetime64(text):
+    try:
+        return np.datetime64(text, "s")
+    except ValueError:
+        return np.datetime64("NaT")  # left to _store()
+
+
+def _compact_score(value):
+    if isinstance(value, int) and not isinstance(value, bool) and 0 < value <= 127:
+        return value
+    return NO_SCORE
+
+
+def _as_float(scores):
+    """int8 scores as floats, NaN where there is no usable score."""
+    values = scores.astype(float)
+    values[scores == NO_SCORE] = np.nan
+    return values
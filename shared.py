@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+Response table shared between app processes (replicas behind a load balancer).
+
+One process at a time holds the lead: it alone syncs with the response sheet
+and publishes each new version of its table. The others load the published
+table instead of polling the sheet, so API use stays flat however many
+replicas run. If the leader goes away, the next process to ask takes over.
+
+- FileShare: a snapshot file on a disk all replicas can see; the lead is an
+  exclusive lock on a file next to it, released when the process exits.
+- RedisShare: a key on a Redis server (or anything with the same get/set/
+  expire calls, such as MemoryRedis in-process); the lead is a key that
+  expires unless the leader keeps renewing it.
+"""
+
+import os
+import threading
+import time
+import uuid
+from io import BytesIO
+
+
+class FileShare:
+    """Table published as a snapshot file, lead held with flock()."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock_file = None
+
+    def lead(self):
+        if self._lock_file is None:
+            import fcntl  # POSIX only; RedisShare works anywhere
+            f = open(f"{self.path}.lock", "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+            self._lock_file = f  # kept open: the lock lasts as long as the process
+        return True
+
+    def publish(self, table, watermark):
+        table.save(self.path, watermark)
+
+    def stamp(self):
+        """Changes whenever a new version is published; None if there is none."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def fetch(self, table):
+        return table.load(self.path)
+
+
+class RedisShare:
+    """Table published under a Redis key, lead held as an expiring key."""
+
+    def __init__(self, client, key="healthy-church:responses", lease=60):
+        self.client = client
+        self.key = key
+        self.lease = lease  # seconds the lead survives without being renewed
+        self._id = uuid.uuid4().hex
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("shared_cache = \"redis\" needs the redis package installed") from e
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def lead(self):
+        lock = f"{self.key}:leader"
+        if self.client.set(lock, self._id, nx=True, ex=self.lease):
+            return True
+        if _text(self.client.get(lock)) == self._id:
+            self.client.expire(lock, self.lease)
+            return True
+        return False
+
+    def publish(self, table, watermark):
+        data = BytesIO()
+        table.dump(data, watermark)
+        self.client.set(self.key, data.getvalue())
+        self.client.set(f"{self.key}:stamp", uuid.uuid4().hex)
+
+    def stamp(self):
+        return _text(self.client.get(f"{self.key}:stamp"))
+
+    def fetch(self, table):
+        data = self.client.get(self.key)
+        if data is None:
+            raise FileNotFoundError(self.key)
+        return table.load(BytesIO(data))
+
+
+class MemoryRedis:
+    """In-process stand-in for the few Redis calls RedisShare makes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}  # key -> (value, expiry time or None)
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            self._data[key] = (value, None if ex is None else time.monotonic() + ex)
+            return True
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._live(key) is None:
+                return False
+            self._data[key] = (self._data[key][0], time.monotonic() + seconds)
+            return True
+
+    def _live(self, key):
+        value, expires = self._data.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+Google Sheets connection shared by every session of the app.
+
+Authorizing the service account and opening the spreadsheet costs an OAuth
+handshake plus a metadata round trip, so it is done once per process and the
+worksheet handle is reused. The underlying google-auth session refreshes its
+access token on its own; we only reconnect on auth or transport errors.
+
+Every API call made through the pool also takes a token from a shared token
+bucket sized to the project's Sheets quota, so bursts are smoothed out here
+instead of coming back as 429s.
+"""
+
+import threading
+import time
+
+import gspread
+import requests
+from google.auth.exceptions import RefreshError, TransportError
+from google.oauth2.service_account import Credentials
+
+from metrics import metrics
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# Errors that mean the cached client is no longer usable
+RECONNECT_ERRORS = (
+    RefreshError,
+    TransportError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+
+class RateLimited(Exception):
+    """No API budget left right now and the caller chose not to wait."""
+
+
+class TokenBucket:
+    """Allow `rate` calls per `per` seconds on average, in bursts of up to `burst`."""
+
+    def __init__(self, rate, per=60.0, burst=None):
+        self.capacity = float(burst or rate)
+        self.fill_rate = rate / per
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, block=True):
+        """Take one token; waits for it unless block is False (then returns False)."""
+        queued = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.fill_rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                delay = (1 - self._tokens) / self.fill_rate
+                if not block:
+                    return False
+                if not queued:
+                    metrics.count("sheets_throttled")
+                    queued = True
+            time.sleep(delay)
+
+
+def needs_reconnect(error) -> bool:
+    if isinstance(error, RECONNECT_ERRORS):
+        return True
+    # 401 = token rejected by the API even though google-auth thought it was valid
+    return isinstance(error, gspread.exceptions.APIError) and error.code == 401
+
+
+def _error_label(error):
+    # HTTP status for API errors (429 = over quota), else the exception type
+    if isinstance(error, gspread.exceptions.APIError):
+        return str(error.code)
+    return type(error).__name__
+
+
+class SheetPool:
+    """Thread-safe holder of one authorized worksheet handle."""
+
+    def __init__(self, service_account_info, sheet_url, requests_per_minute=60):
+        self._info = dict(service_account_info)
+        self._url = sheet_url
+        self.limiter = TokenBucket(requests_per_minute)
+        self._lock = threading.Lock()
+        self._sheet = None
+        self.handshakes = 0
+
+    def _connect(self):
+        with metrics.timer("sheets.connect"):
+            creds = Credentials.from_service_account_info(self._info, scopes=SCOPES)
+            client = gspread.authorize(creds)
+            self.limiter.acquire()  # opening the spreadsheet is an API call too
+            sheet = client.open_by_url(self._url).sheet1
+        self.handshakes += 1
+        metrics.count("sheets_handshakes")
+        print(f"Google Sheets handshake #{self.handshakes}")
+        return sheet
+
+    def worksheet(self):
+        """Return the shared worksheet, connecting on first use."""
+        with self._lock:
+            if self._sheet is None:
+                self._sheet = self._connect()
+            return self._sheet
+
+    def reset(self, stale=None):
+        """Drop the cached handle (only if it is still `stale`, when given)."""
+        with self._lock:
+            if stale is None or self._sheet is stale:
+                self._sheet = None
+
+    def call(self, fn, retry=True, wait=True, op="call"):
+        """Run fn(worksheet), reconnecting if the connection went bad.
+
+        Reads are retried once on the new connection. Pass retry=False for
+        writes, where we can't tell whether the failed request went through.
+        With wait=False, raises RateLimited instead of queueing for budget.
+        op names the request in the metrics.
+        """
+        if not self.limiter.acquire(block=wait):
+            metrics.count("sheets_rate_limited", op=op)
+            raise RateLimited()
+        sheet = self.worksheet()
+        try:
+            return self._timed_call(fn, sheet, op)
+        except Exception as e:
+            metrics.count("sheets_errors", op=op, error=_error_label(e))
+            if not needs_reconnect(e):
+                raise
+            print("Google Sheets connection lost, reconnecting:", e)
+            self.reset(sheet)
+            if not retry:
+                raise
+            self.limiter.acquire()
+            metrics.count("sheets_retries", op=op)
+            return self._timed_call(fn, self.worksheet(), op)
+
+    def _timed_call(self, fn, sheet, op):
+        metrics.count("sheets_api_calls", op=op)
+        with metrics.timer(f"sheets.{op}"):
+            return fn(sheet)
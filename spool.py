@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+Write-behind queue for survey submissions.
+
+A submission is first committed to a local SQLite file, so the respondent
+gets an answer right away and nothing is lost if Google Sheets is slow or
+over quota. A background thread sends whatever has queued up in batches with
+one append_rows() call, backing off exponentially when the API refuses.
+
+Rows are marked "sending" before the request goes out. If we never learn
+whether a request went through (timeout, dropped connection, 5xx, crash) the
+rows stay in that state and are checked against the sheet before being sent
+again, so a response is never written twice.
+
+Several processes may share one spool file (replicas started in the same
+directory). A batch is claimed in a single write transaction and tagged with
+the claiming spool's owner id, so no two processes send the same rows. Rows
+another process is sending are left alone unless it has exited or its claim
+is older than a lease long enough for any request to have finished.
+"""
+
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import gspread
+
+from metrics import metrics
+
+PENDING = "pending"
+SENDING = "sending"
+HOST = socket.gethostname()
+
+
+def _definitely_rejected(error) -> bool:
+    # an API error below 500 means the request was refused, nothing was written
+    return isinstance(error, gspread.exceptions.APIError) and 0 < error.code < 500
+
+
+def _gone(owner) -> bool:
+    """Whether the process behind an owner id has exited (only knowable for this host on POSIX)."""
+    if not owner:
+        return True  # claimed before rows had owners
+    host, _, rest = owner.partition(":")
+    pid = rest.partition(":")[0]
+    if host != HOST or os.name != "posix" or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass  # exists, owned by someone else
+    return False
+
+
+class SubmissionSpool:
+    """Durable local queue flushed to the sheet by a background thread.
+
+    send(rows) writes a batch to the sheet, watermark() returns how many data
+    rows we know the sheet had before sending, and landed(rows, since) tells
+    for each row whether it already appears after that position.
+    """
+
+    def __init__(self, path, send, watermark, landed, batch_size=500,
+                 linger=0.5, max_backoff=64.0, lease=300.0):
+        self._send = send
+        self._watermark = watermark
+        self._landed = landed
+        self.batch_size = batch_size
+        self.linger = linger  # wait a moment so a burst goes out as one batch
+        self.max_backoff = max_backoff
+        self.lease = lease  # seconds after which another process's claim counts as abandoned
+        self.owner = f"{HOST}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " row TEXT NOT NULL,"
+            " state TEXT NOT NULL DEFAULT 'pending',"
+            " mark INTEGER,"
+            " owner TEXT,"
+            " claimed REAL)"
+        )
+        columns = {c[1] for c in self._db.execute("PRAGMA table_info(spool)")}
+        for name, kind in (("owner", "TEXT"), ("claimed", "REAL")):
+            if name not in columns:  # spool file from before claims had owners
+                try:
+                    self._db.execute(f"ALTER TABLE spool ADD COLUMN {name} {kind}")
+                except sqlite3.OperationalError:
+                    pass  # another process added it first
+        self._db.commit()
+        self._thread = threading.Thread(target=self._run, name="submission-spool", daemon=True)
+        self._thread.start()
+        self._wake.set()  # pick up anything left over from a previous run
+
+    def put(self, row):
+        """Queue a row; returns once it is safely on local disk."""
+        self.put_many([row])
+
+    def put_many(self, rows):
+        with self._lock:
+            self._db.executemany("INSERT INTO spool (row) VALUES (?)", [(json.dumps(list(r)),) for r in rows])
+            self._db.commit()
+        self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            if self._failures:
+                # 2s, 4s, 8s ... with jitter so replicas don't retry in lockstep
+                delay = min(self.max_backoff, 2.0 ** self._failures) * random.uniform(0.8, 1.2)
+            else:
+                delay = self.linger
+            time.sleep(delay)
+            self._wake.clear()
+            try:
+                more = self.flush()
+            except Exception as e:
+                self._failures += 1
+                metrics.count("spool_send_failures")
+                print(f"Google Sheets write error (attempt {self._failures}):", e)
+                more = True
+            else:
+                self._failures = 0
+            if more:
+                self._wake.set()
+
+    def flush(self):
+        """Send one batch. Returns True if rows are still waiting."""
+        self._resolve_uncertain()
+
+        mark = self._watermark()
+        with self._lock, self._claiming():
+            ids = [i for (i,) in self._db.execute(
+                "SELECT id FROM spool WHERE state = ? ORDER BY id LIMIT ?", (PENDING, self.batch_size)
+            )]
+            self._claim(ids, PENDING, state=SENDING, mark=mark)
+        batch = self._owned(ids)
+        if not batch:
+            return False
+
+        try:
+            self._send([json.loads(row) for _, row in batch])
+        except Exception as e:
+            if _definitely_rejected(e):
+                with self._lock:
+                    self._db.executemany(
+                        "UPDATE spool SET state = ?, owner = NULL WHERE id = ?", [(PENDING, i) for i, _ in batch]
+                    )
+                    self._db.commit()
+            raise
+
+        with self._lock:
+            self._db.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i, _ in batch])
+            self._db.commit()
+        metrics.count("spool_rows_sent", len(batch))
+        return len(batch) == self.batch_size
+
+    def _resolve_uncertain(self):
+        # rows whose earlier send may or may not have reached the sheet: ours,
+        # or left behind by a process that exited or stopped renewing its claim
+        with self._lock, self._claiming():
+            stale = time.time() - self.lease
+            ids = [i for i, owner, claimed in self._db.execute(
+                "SELECT id, owner, claimed FROM spool WHERE state = ? ORDER BY id", (SENDING,)
+            ) if owner == self.owner or claimed is None or claimed < stale or _gone(owner)]
+            self._claim(ids, SENDING)
+        uncertain = self._owned(ids, with_mark=True)
+        if not uncertain:
+            return
+        metrics.count("spool_uncertain_checks")
+        since = min(mark for _, _, mark in uncertain)
+        landed = self._landed([json.loads(row) for _, row, _ in uncertain], since)
+        with self._lock:
+            for (i, _, _), done in zip(uncertain, landed):
+                if done:
+                    self._db.execute("DELETE FROM spool WHERE id = ?", (i,))
+                else:
+                    self._db.execute("UPDATE spool SET state = ?, owner = NULL WHERE id = ?", (PENDING, i))
+            self._db.commit()
+        print(f"Checked {len(uncertain)} unconfirmed submissions, {sum(landed)} already in the sheet")
+
+    def _claiming(self):
+        """Write transaction that other processes' claims wait for (use under self._lock)."""
+        self._db.execute("BEGIN IMMEDIATE")
+        return self._db  # the connection as context manager: commit, or roll back on error
+
+    def _claim(self, ids, state_now, **changes):
+        # only rows still in state_now are taken: another process may have got there first
+        if not ids:
+            return
+        changes = {"owner": self.owner, "claimed": time.time(), **changes}
+        assignments = ", ".join(f"{name} = ?" for name in changes)
+        self._db.execute(
+            f"UPDATE spool SET {assignments} WHERE state = ? AND id IN ({', '.join('?' * len(ids))})",
+            [*changes.values(), state_now, *ids]
+        )
+
+    def _owned(self, ids, with_mark=False):
+        """The rows among ids that this spool holds a claim on."""
+        if not ids:
+            return []
+        with self._lock:
+            return self._db.execute(
+                f"SELECT id, row{', mark' if with_mark else ''} FROM spool"
+                f" WHERE state = ? AND owner = ? AND id IN ({', '.join('?' * len(ids))}) ORDER BY id",
+                [SENDING, self.owner, *ids]
+            ).fetchall()
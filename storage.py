@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+Where survey responses are kept.
+
+Every store offers the same operations (append, bulk append, query by code
+and date, Control ID check) and keeps a ResponseTable in step with what it
+holds, which is what the results pages read from.
+
+- SheetsStore: the Google Sheet. Writes go through the local submission
+  spool; reads only download rows added since the last sync.
+- SQLiteStore: a local SQLite file in WAL mode, indexed on Code,
+  (Code, Control_ID) and Timestamp. It can mirror every write to a
+  SheetsStore, which sends them to the sheet in the background.
+
+With a snapshot path, a store saves its table to a local .npz file every
+few minutes and loads it on the first refresh after a restart, so it only
+has to catch up on rows added since, not download everything again.
+
+With a share (see shared.py), only the process holding the lead syncs the
+table; it keeps doing so from a background thread and publishes every new
+version, and the other processes load that instead of syncing themselves.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+
+from gspread.utils import rowcol_to_a1
+
+from aggregates import QUESTIONS, parse_day
+from metrics import metrics
+from responses import HEADER, ResponseTable, numericise_row
+from sheets import RateLimited
+from spool import SubmissionSpool
+
+
+class ResponseStore:
+    """Common interface; subclasses implement _sync() and the data methods."""
+
+    refresh_interval = 0  # seconds a synced table is considered fresh
+    snapshot_interval = 300  # seconds between snapshot writes while rows keep arriving
+
+    def __init__(self, snapshot_path=None, share=None):
+        self.table = ResponseTable()
+        self.snapshot_path = snapshot_path
+        self._restore = snapshot_path is not None  # until the first sync has tried
+        self._snapshot_version = None
+        self._snapshot_at = 0.0
+        self.share = share
+        self._shared_stamp = None  # stamp of the shared version we hold
+        self._published_version = None
+        self._refresher = None
+        self._refresher_lock = threading.Lock()
+
+    def refresh(self, max_age=None, wait=False):
+        """The store's ResponseTable, synced if it is older than max_age.
+
+        wait=True insists on up-to-date rows; otherwise slightly stale rows
+        may be returned while another sync or the API budget is busy.
+        """
+        max_age = self.refresh_interval if max_age is None else max_age
+        if self.share is not None and self._refresher is None:
+            self._start_refresher()
+        self.table.refresh(lambda table: self._sync_with_snapshot(table, wait), max_age, wait)
+        return self.table
+
+    def append(self, row):
+        self.append_many([row])
+
+    def append_many(self, rows):
+        raise NotImplementedError
+
+    def query(self, code, start=None, end=None):
+        """Records for a church code, optionally limited to dates start..end."""
+        raise NotImplementedError
+
+    def has_control_id(self, code, control_id):
+        raise NotImplementedError
+
+    def _sync(self, table, wait):
+        raise NotImplementedError
+
+    def _sync_with_snapshot(self, table, wait):
+        if self._restore:
+            self._restore = False
+            self._load_snapshot(table)
+        leading = self.share is None or self.share.lead()
+        if not leading or (self.share is not None and not table.header):
+            # wait=True insists on rows straight from the store, not
+            # whatever the leader published last
+            if self._follow(table) and not leading and not wait:
+                return
+        self._sync(table, wait)
+        if leading and self.share is not None and table.version != self._published_version:
+            with metrics.timer("shared.publish"):
+                self.share.publish(table, self._watermark())
+            self._published_version = table.version
+        if self.snapshot_path and table.version != self._snapshot_version \
+                and time.monotonic() - self._snapshot_at >= self.snapshot_interval:
+            try:
+                with metrics.timer("snapshot.save"):
+                    table.save(self.snapshot_path, self._watermark())
+            except OSError as e:
+                print("Could not write response snapshot:", e)
+            self._snapshot_version = table.version
+            self._snapshot_at = time.monotonic()
+
+    def _load_snapshot(self, table):
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with metrics.timer("snapshot.load"):
+                watermark = table.load(self.snapshot_path)
+        except Exception as e:
+            print("Ignoring unreadable response snapshot:", e)
+            return
+        if not self._restored(table, watermark):
+            print("Response snapshot doesn't match the store, ignoring it")
+            table.reset([])
+            return
+        self._snapshot_version = table.version
+        self._snapshot_at = time.monotonic()
+        print(f"Loaded {len(table)} responses from {self.snapshot_path}")
+
+    def _follow(self, table):
+        """Pick up the leader's latest table; False if there is nothing usable to follow."""
+        stamp = self.share.stamp()
+        if stamp is None:
+            return False  # nothing published yet
+        if stamp == self._shared_stamp:
+            return True
+        try:
+            with metrics.timer("shared.fetch"):
+                watermark = self.share.fetch(table)
+            metrics.count("shared_fetches")
+        except Exception as e:
+            print("Could not load the shared response table:", e)
+            return False
+        if not self._restored(table, watermark):
+            table.reset([])
+            return False
+        self._shared_stamp = stamp
+        return True
+
+    def _start_refresher(self):
+        with self._refresher_lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_loop, name="shared-refresher", daemon=True)
+                self._refresher.start()
+
+    def _refresh_loop(self):
+        # keeps the shared table current even when no visitor reaches the leader
+        while True:
+            time.sleep(self.refresh_interval or 15)
+            try:
+                if self.share.lead():
+                    self.refresh(max_age=0)
+            except Exception as e:
+                print("Shared response table refresh failed:", e)
+
+    def _watermark(self):
+        """What the store needs to know to carry on from a snapshot of its table."""
+        return None
+
+    def _restored(self, table, watermark):
+        """Take up a snapshot's watermark; False if the snapshot doesn't belong to this store."""
+        return True
+
+
+class SheetsStore(ResponseStore):
+    """Responses kept in the Google Sheet."""
+
+    refresh_interval = 15
+
+    def __init__(self, pool, spool_path, snapshot_path=None, share=None):
+        super().__init__(snapshot_path, share)
+        self.pool = pool
+        self.spool = SubmissionSpool(spool_path, self._send, lambda: len(self.table), self._landed)
+
+    def append_many(self, rows, merge_local=True):
+        self.spool.put_many(rows)  # written to the sheet in the background
+        if merge_local:
+            for row in rows:
+                self.table.add_local(row)  # visible to results right away
+
+    def query(self, code, start=None, end=None):
+        records = self.refresh().code_records(code)
+        if start is None and end is None:
+            return records
+        first = start.toordinal() if start else float("-inf")
+        last = end.toordinal() if end else float("inf")
+        days = ((r, parse_day(r["Timestamp"])) for r in records)
+        return [r for r, day in days if day is not None and first <= day <= last]
+
+    def has_control_id(self, code, control_id):
+        return self.refresh().has_control_id(code, control_id)
+
+    def _send(self, rows):
+        self.pool.call(lambda sheet: sheet.append_rows(rows), retry=False, op="append_rows")
+
+    def _landed(self, rows, since):
+        self.table.expire()
+        return self.refresh(wait=True).rows_landed(rows, since)
+
+    # No watermark needed: the incremental sync already checks the header
+    # and the last row it holds against the sheet before reading further.
+
+    def _sync(self, table, wait):
+        # Out of API budget and we have rows to show: keep showing them.
+        wait = wait or not table.header
+        try:
+            self._sync_rows(table, wait)
+        except RateLimited:
+            metrics.count("stale_reads")
+
+    def _sync_rows(self, table, wait):
+        # Responses are append-only: after the first full download, ask only
+        # for the rows below the last one we ingested. The same request
+        # re-reads the header and that last row; if either changed (rows
+        # deleted, sorted or edited by hand) fall back to a full download.
+        if not table.header:
+            return self._full_sync(table, wait)
+        metrics.count("table_syncs", kind="incremental")
+        width = len(table.header)
+        last_col = rowcol_to_a1(1, width).rstrip("0123456789")
+        n = len(table) + 1  # sheet row number of the last ingested row
+        header, last, new = self.pool.call(lambda sheet: sheet.batch_get(
+            ["1:1", f"A{n}:{last_col}{n}", f"A{n + 1}:{last_col}"]
+        ), wait=wait, op="batch_get")
+        expected_last = table.last_row if len(table) else table.header
+        header = header[0] if header else []
+        last = numericise_row(last[0] if last else [], width)
+        # "1:1" is the whole header row, so a column added on the right shows up as extra width
+        if len(header) > width or numericise_row(header, width) != numericise_row(table.header, width) \
+                or last != numericise_row(expected_last, width):
+            print("Response sheet changed underneath us, doing a full resync")
+            return self._full_sync(table, wait)
+        with metrics.timer("table.ingest"):
+            table.ingest(new)
+        metrics.count("table_rows_ingested", len(new))
+
+    def _full_sync(self, table, wait):
+        metrics.count("table_syncs", kind="full")
+        values = self.pool.call(lambda sheet: sheet.get_values(), wait=wait, op="get_values")
+        with metrics.timer("table.ingest"):
+            table.reset(values[0] if values else [], values[1:])
+        metrics.count("table_rows_ingested", max(len(values) - 1, 0))
+
+
+class SQLiteStore(ResponseStore):
+    """Responses kept in a local SQLite file, optionally mirrored to the sheet."""
+
+    def __init__(self, path, mirror=None, snapshot_path=None, share=None):
+        super().__init__(snapshot_path, share)
+        self.mirror = mirror
+        self._lock = threading.Lock()
+        self._synced_id = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " Timestamp TEXT NOT NULL, Code TEXT NOT NULL, Control_ID TEXT NOT NULL DEFAULT '', "
+            + ", ".join(f"{q} INTEGER" for q in QUESTIONS) + ")"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_code ON responses (Code)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_code_control_id ON responses (Code, Control_ID)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_timestamp ON responses (Timestamp)")
+        self._db.commit()
+
+    def refresh(self, max_age=None, wait=True):
+        # local reads are cheap enough that nobody needs to be served stale rows
+        return super().refresh(max_age, wait)
+
+    def append_many(self, rows):
+        rows = [list(row) for row in rows]
+        with self._lock:
+            self._db.executemany(
+                f"INSERT INTO responses ({', '.join(HEADER)}) VALUES ({', '.join('?' * len(HEADER))})",
+                rows
+            )
+            self._db.commit()
+        self.table.expire()  # picking the new rows up is a local read
+        if self.mirror is not None:
+            self.mirror.append_many(rows, merge_local=False)
+
+    def query(self, code, start=None, end=None):
+        sql = f"SELECT {', '.join(HEADER)} FROM responses WHERE Code = ?"
+        params = [code.strip()]
+        if start is not None:
+            sql += " AND Timestamp >= ?"
+            params.append(start.strftime("%Y-%m-%d"))
+        if end is not None:
+            sql += " AND Timestamp < ?"
+            params.append((end + timedelta(days=1)).strftime("%Y-%m-%d"))
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY id", params).fetchall()
+        return [dict(zip(HEADER, row)) for row in rows]
+
+    def has_control_id(self, code, control_id):
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM responses WHERE Code = ? AND Control_ID = ? LIMIT 1",
+                (code.strip(), control_id.strip())
+            ).fetchone() is not None
+
+    def _watermark(self):
+        return self._synced_id
+
+    def _restored(self, table, watermark):
+        # same database only if it holds exactly as many rows up to the watermark
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM responses WHERE id <= ?", (watermark,)).fetchone()[0]
+        if count != len(table) or table.header != HEADER:
+            return False
+        self._synced_id = watermark
+        return True
+
+    def _sync(self, table, wait):
+        if not table.header:
+            table.reset(HEADER)
+            self._synced_id = 0
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, {', '.join(HEADER)} FROM responses WHERE id > ? ORDER BY id",
+                (self._synced_id,)
+            ).fetchall()
+        metrics.count("table_syncs", kind="sqlite")
+        if rows:
+            with metrics.timer("table.ingest"):
+                table.ingest([row[1:] for row in rows])
+            metrics.count("table_rows_ingested", len(rows))
+            self._synced_id = rows[-1][0]
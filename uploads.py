@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Wendell Q. Campano
+# All rights reserved; code may not be copied or used without written permission.
+"""
+Streaming readers for the two uploaders in "Other Options".
+
+The header is read and checked before any data rows, so a wrong file is
+rejected straight away. Rows are then read in chunks: CSV through pandas'
+chunked reader and .xlsx through openpyxl in read-only mode. Scores are
+folded into a ScoreStats as they stream past, so a whole spreadsheet is
+never held in memory. Old .xls files can't be streamed and are read whole.
+
+pandas and openpyxl are imported on first use, so importing this module
+(e.g. for UploadError) costs nothing until a file is actually uploaded.
+"""
+
+from contextlib import contextmanager
+
+import numpy as np
+
+from aggregates import QUESTIONS, ScoreStats
+
+CHUNK_ROWS = 50_000
+
+SURVEY_COLUMNS = [q.lower() for q in QUESTIONS]
+
+
+class UploadError(ValueError):
+    """The uploaded file doesn't have the columns we need."""
+
+
+def _column(name):
+    return "" if name is None else str(name).strip().lower()
+
+
+def _key(value):
+    return "" if value is None or (isinstance(value, float) and np.isnan(value)) else str(value).strip()
+
+
+@contextmanager
+def read_chunks(file, dtype=None):
+    """(lower-cased header, iterator of DataFrame chunks) for an upload.
+
+    Used as a context manager: the reader or workbook behind the chunks is
+    closed on leaving the with block, however many chunks were read.
+    """
+    import pandas as pd
+    file.seek(0)
+    name = file.name.lower()
+    if name.endswith(".csv"):
+        header = [_column(c) for c in pd.read_csv(file, nrows=0).columns]
+        file.seek(0)
+        with pd.read_csv(file, chunksize=CHUNK_ROWS, dtype=dtype, keep_default_na=dtype is None) as reader:
+            yield header, (chunk.set_axis(header, axis=1) for chunk in reader)
+    elif name.endswith(".xlsx"):
+        import openpyxl
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            yield _xlsx_chunks(workbook)
+        finally:
+            workbook.close()
+    else:
+        df = pd.read_excel(file, dtype=dtype)
+        header = [_column(c) for c in df.columns]
+        yield header, iter([df.set_axis(header, axis=1)])
+
+
+def _xlsx_chunks(workbook):
+    import pandas as pd
+    rows = workbook.active.iter_rows(values_only=True)
+    header = [_column(c) for c in next(rows, ())]
+    while header and not header[-1]:
+        header.pop()  # formatting can extend the sheet past the last real column
+
+    def chunks():
+        batch = []
+        for row in rows:
+            row = row[:len(header)]
+            if all(v is None for v in row):
+                continue
+            batch.append(row)
+            if len(batch) == CHUNK_ROWS:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+
+    return header, chunks()
+
+
+def survey_stats(file):
+    """Q1–Q7 aggregates of an uploaded file containing exactly those columns."""
+    import pandas as pd
+    with read_chunks(file) as (header, chunks):
+        if header != SURVEY_COLUMNS:
+            raise UploadError(
+                f"⚠️ Invalid file format. Must contain ONLY these columns in order: {', '.join(QUESTIONS)}"
+            )
+        stats = ScoreStats()
+        for chunk in chunks:
+            stats.add_values(chunk.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float))
+    return stats
+
+
+def control_id_pairs(file):
+    """(code, control_id) pairs from an uploaded list of respondents."""
+    from responses import pair_key  # keyed like the sheet's (numericised) values
+    with read_chunks(file, dtype=str) as (header, chunks):
+        if "church_code" in header and "code" not in header:
+            header = ["code" if c == "church_code" else c for c in header]
+            chunks = (chunk.rename(columns={"church_code": "code"}) for chunk in chunks)
+        if not {"code", "control_id"}.issubset(header):
+            raise UploadError("⚠️ Invalid file. Must contain columns: Code and Control_ID.")
+        pairs = []
+        for chunk in chunks:
+            codes, control_ids = chunk["code"].map(_key), chunk["control_id"].map(_key)
+            pairs.extend(pair_key(code, control_id) for code, control_id in zip(codes, control_ids))
+    return pairs